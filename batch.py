@@ -0,0 +1,160 @@
+"""Run many seeded headless games in parallel and aggregate results per level.
+
+    python batch.py --episodes 200 --levels 1-8 --workers 8 --out runs.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import NEIGHBORS, Bag, Simulation, seed_arg
+
+
+class GreedyBot:
+    # walks the shortest path to the nearest emerald and shoots monsters in line
+    def __init__(self, replan_ticks=4, sight=6):
+        self.replan_ticks = replan_ticks
+        self.sight = sight
+
+    def act(self, sim):
+        if sim.ticks % self.replan_ticks == 0:
+            sim.set_direction(self.next_direction(sim))
+        if sim.shot_cd <= 0 and self.monster_in_line(sim):
+            sim.shoot()
+
+    def next_direction(self, sim):
+        start = sim.player_tile()
+        targets = set(sim.emeralds)
+        targets.update(b.tile() for b in sim.bags if b.state == Bag.GOLD)
+        if not targets:
+            return None
+        first = {start: None}
+        q = deque([start])
+        while q:
+            x, y = q.popleft()
+            if (x, y) in targets:
+                return first[x, y]
+            for dx, dy in NEIGHBORS:
+                nb = (x + dx, y + dy)
+                if nb in first or not sim.in_bounds(*nb):
+                    continue
+                b = sim.bag_at(*nb)
+                if b and b.solid():
+                    continue
+                first[nb] = first[x, y] or (dx, dy)
+                q.append(nb)
+        return None
+
+    def monster_in_line(self, sim):
+        x, y = sim.player_tile()
+        dx, dy = sim.player_dir
+        for _ in range(self.sight):
+            x, y = x + dx, y + dy
+            if sim.tilemap.get(x, y, 0) == 0:
+                return False
+            if any(m.alive for m in sim.monsters_at(x, y)):
+                return True
+        return False
+
+
+def run_episode(seed, level=1, max_seconds=180.0):
+    sim = Simulation(seed, level=level)
+    sim.start()
+    bot = GreedyBot()
+    max_ticks = int(max_seconds / sim.TICK)
+    while sim.state == "PLAYING" and sim.ticks < max_ticks and sim.level == level:
+        bot.act(sim)
+        sim.step()
+
+    cleared = sim.level > level
+    return {
+        "seed": seed,
+        "level": level,
+        "score": sim.score,
+        "cleared": cleared,
+        "game_over": sim.state == "GAME_OVER",
+        "lives_lost": sim.deaths,
+        "time_to_clear": round(sim.ticks * sim.TICK, 3) if cleared else None,
+        "monsters_killed": sim.kills,
+        "ticks": sim.ticks,
+    }
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def aggregate(results):
+    by_level = defaultdict(list)
+    for r in results:
+        by_level[r["level"]].append(r)
+
+    out = {}
+    for level, runs in sorted(by_level.items()):
+        scores = [r["score"] for r in runs]
+        clears = [r["time_to_clear"] for r in runs if r["cleared"]]
+        out[level] = {
+            "episodes": len(runs),
+            "clear_rate": round(len(clears) / len(runs), 3),
+            "score_mean": round(statistics.fmean(scores), 1),
+            "score_median": statistics.median(scores),
+            "score_p10": _percentile(scores, 0.1),
+            "score_p90": _percentile(scores, 0.9),
+            "lives_lost_mean": round(statistics.fmean(r["lives_lost"] for r in runs), 3),
+            "monsters_killed_mean": round(statistics.fmean(r["monsters_killed"] for r in runs), 2),
+            "time_to_clear_median": statistics.median(clears) if clears else None,
+        }
+    return out
+
+
+def parse_levels(spec):
+    levels = []
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        levels.extend(range(int(lo), int(hi or lo) + 1))
+    return levels
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch-run seeded headless games.")
+    ap.add_argument("--episodes", type=int, default=50, help="episodes per level")
+    ap.add_argument("--levels", default="1", help="e.g. 1-8 or 1,3,5")
+    ap.add_argument("--seed", type=seed_arg, default=0, help="first episode seed")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--max-seconds", type=float, default=180.0, help="simulated time cap per episode")
+    ap.add_argument("--out", help="append per-episode results as JSON lines")
+    args = ap.parse_args(argv)
+
+    jobs = [
+        (args.seed + i, level)
+        for level in parse_levels(args.levels)
+        for i in range(args.episodes)
+    ]
+    results = []
+    out = open(args.out, "a", encoding="utf-8") if args.out else None
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(run_episode, seed, level, args.max_seconds) for seed, level in jobs]
+            for done, fut in enumerate(as_completed(futures), 1):
+                r = fut.result()
+                results.append(r)
+                line = json.dumps(r)
+                if out:
+                    out.write(line + "\n")
+                    out.flush()
+                print(f"[{done}/{len(jobs)}] {line}", file=sys.stderr)
+    finally:
+        if out:
+            out.close()
+
+    print(json.dumps(aggregate(results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
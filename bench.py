@@ -0,0 +1,297 @@
+"""Seeded micro-benchmarks for the simulation and rendering hot paths.
+
+    python bench.py --out bench.json
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json   # exits 1 on regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+import levelgen
+import main
+from batch import GreedyBot
+from main import GRID_H, GRID_W, SCREEN_HEIGHT, SCREEN_WIDTH, Bag, Game, Simulation
+
+SEED = 1234
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+
+    return register
+
+
+def _offscreen_game():
+    # sprites need a display mode for convert_alpha; the dummy one is enough
+    if pygame.display.get_surface() is None:
+        pygame.mixer.pre_init(44100, -16, 1, 512)
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+    return Game(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)), SEED)
+
+
+@scenario("pathfinding_12_monsters")
+def bench_pathfinding():
+    # one flow-field rebuild per monster type per player move, then a step
+    # choice for 12 monsters; they are registered so each build covers all of them
+    sim = Simulation(SEED)
+    rng = random.Random(SEED)
+    for _ in range(150):
+        sim.dig(rng.randrange(GRID_W), rng.randrange(GRID_H))
+    tunnels = [(x, y) for y in range(GRID_H) for x in range(GRID_W) if sim.tilemap[x, y] == 1]
+    for i in range(12):
+        sim.add_monster(sim.monster_pool.acquire(*rng.choice(tunnels), "nobbin" if i % 2 else "hobbin", 2.8, rng))
+    monsters = [(m.cell, m.type) for m in sim.monsters]
+    goals = rng.sample(tunnels, 32)
+    i = 0
+
+    def op():
+        nonlocal i
+        i += 1
+        sim.player_x, sim.player_y = goals[i % len(goals)]
+        sim.nav_version += 1
+        for tile, mtype in monsters:
+            sim.path_next(tile, mtype)
+
+    return op
+
+
+@scenario("bag_cascade_90_ticks")
+def bench_bag_cascade():
+    # every other column stacked with bags, the row beneath dug out
+    sim = Simulation(SEED)
+    sim.start()
+    sim.bags, sim.bag_grid = [], {}
+    sim.emeralds = {(0, 0)}
+    sim.total_monsters = 0
+    sim.player_x, sim.player_y = 1.0, 1.0
+    for x in range(2, GRID_W - 2, 2):
+        for y in range(2, GRID_H - 3):
+            sim.add_bag(Bag(x, y))
+    for x in range(2, GRID_W - 2):
+        sim.dig(x, GRID_H - 3)
+    start = sim.snapshot()
+
+    def op():
+        sim.restore(start)
+        for _ in range(90):
+            sim.step()
+
+    return op
+
+
+@scenario("draw_full_frame_full_earth")
+def bench_draw_full_earth():
+    game = _offscreen_game()
+    game.tilemap.fill(0)
+    game.build_terrain()
+    game.start()
+
+    def op():
+        game.full_redraw = True
+        game.draw()
+
+    return op
+
+
+@scenario("build_terrain_full_earth")
+def bench_build_terrain():
+    game = _offscreen_game()
+    game.tilemap.fill(0)
+    return game.build_terrain
+
+
+@scenario("tone_synthesis_sfx_set")
+def bench_tone_synthesis():
+    audio = _offscreen_game().audio
+    names = [n for n in main.AUDIO_NAMES if n.startswith("sfx_") and n != "sfx_level_clear"]
+
+    def op():
+        for name in names:
+            audio._synth_sfx(name)
+
+    return op
+
+
+@scenario("new_level_generation")
+def bench_new_level():
+    sim = Simulation(SEED)
+    return sim.new_level
+
+
+@scenario("level_layout_generate")
+def bench_level_generate():
+    # a fresh seed per call, so the layout cache never answers
+    seeds = iter(range(SEED, SEED + 10**9))
+    return lambda: levelgen.generate(next(seeds), GRID_W, GRID_H)
+
+
+@scenario("swarm_tick_500_monsters")
+def bench_swarm_tick():
+    sim = Simulation(SEED, width=60, height=40, swarm=500)
+    sim.start()
+    sim.lives = 10**6  # keep the swarm level running however often it catches the player
+    for _ in range(1200):
+        sim.step()
+    start = sim.snapshot()
+
+    def op():
+        sim.restore(start)
+        for _ in range(30):
+            sim.step()
+
+    return op
+
+
+@scenario("vec_env_step_16")
+def bench_vec_env_step():
+    from env import VecEnv
+
+    venv = VecEnv(16)
+    venv.reset(SEED)
+    rng = random.Random(SEED)
+    actions = [[rng.randrange(venv.action_count) for _ in range(16)] for _ in range(64)]
+    i = 0
+
+    def op():
+        nonlocal i
+        i += 1
+        venv.step(actions[i % len(actions)])
+
+    return op
+
+
+@scenario("broadcast_publish_tick")
+def bench_broadcast_publish():
+    # one tick plus its delta to a connected spectator, which drains the socket
+    from broadcast import Broadcaster, Spectator
+
+    sim = Simulation(SEED)
+    sim.start()
+    sim.lives = 10**6
+    host = Broadcaster("127.0.0.1:0")
+    viewer = Spectator(host.address)
+    bot = GreedyBot()
+
+    def op():
+        bot.act(sim)
+        sim.step()
+        host.publish(sim)
+        viewer.poll()
+
+    return op
+
+
+@scenario("simulation_tick_level_8")
+def bench_sim_tick():
+    sim = Simulation(SEED, level=8)
+    sim.start()
+    bot = GreedyBot()
+    for _ in range(600):
+        bot.act(sim)
+        sim.step()
+    start = sim.snapshot()
+
+    def op():
+        sim.restore(start)
+        for _ in range(60):
+            bot.act(sim)
+            sim.step()
+
+    return op
+
+
+def measure(op, repeats):
+    timer = timeit.Timer(op)
+    number, _ = timer.autorange()
+    samples = [t / number * 1e6 for t in timer.repeat(repeat=repeats, number=number)]
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "number": number,
+        "repeats": repeats,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = cur["median_us"] / base["median_us"]
+        cur["baseline_us"] = base["median_us"]
+        cur["ratio"] = round(ratio, 3)
+        if ratio > 1.0 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main_cli(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark simulation and rendering hot paths.")
+    ap.add_argument("--only", action="append", choices=sorted(SCENARIOS), help="run just these scenarios")
+    ap.add_argument("--repeats", type=int, default=5)
+    ap.add_argument("--out", help="write results JSON here instead of stdout")
+    ap.add_argument("--baseline", help="compare against this results JSON")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", metavar="PATH", help="also store these results as the new baseline")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for name in args.only or SCENARIOS:
+        results[name] = measure(SCENARIOS[name](), args.repeats)
+        print(f"{name:<30} {results[name]['median_us']:>12.1f} us", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": main.np.__version__ if main.np is not None else None,
+            "machine": platform.machine(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name in regressions:
+            r = results[name]
+            print(f"REGRESSION {name}: {r['median_us']:.1f} us vs {r['baseline_us']:.1f} us ({r['ratio']:.2f}x)", file=sys.stderr)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
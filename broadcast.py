@@ -0,0 +1,504 @@
+"""Live spectator stream: the host publishes per-tick state deltas over a
+local socket, viewers rebuild the state and draw it.
+
+    python main.py --broadcast 127.0.0.1:7777        # host
+    python broadcast.py 127.0.0.1:7777               # window viewer
+    python broadcast.py unix:/tmp/digger.sock --text # terminal viewer
+
+Every message is a length-prefixed binary frame. A keyframe carries the
+whole state; it goes to each new client, to everyone every KEYFRAME_TICKS
+and whenever the level changes. Between keyframes a delta carries the HUD
+line plus dug tiles, collected emeralds, changed or removed bags, and the
+monster and shot lists when they moved.
+"""
+import argparse
+import errno
+import os
+import select
+import socket
+import stat
+import struct
+import sys
+import time
+import zlib
+from collections import deque
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+KEYFRAME_TICKS = 300
+MAX_BACKLOG = 1 << 20  # bytes queued for a slow client before it is resynced
+Q = 32  # positions travel as 1/32 tile fixed point
+
+KEYFRAME, DELTA = 0, 1
+FRAME = struct.Struct("<IBI")  # payload length, kind, tick
+HUD = struct.Struct("<iHHBHHbb?")  # score, lives, level, state, player x, y, direction, bonus
+SIZE = struct.Struct("<HH")
+COUNT = struct.Struct("<I")
+UNCHANGED = 0xFFFFFFFF
+BAG = struct.Struct("<IHHBB")  # seq, tile x, y, state, fall offset in 1/256 tile
+MOB = struct.Struct("<HHB")  # x, y, type
+SHOT = struct.Struct("<HH")
+
+
+def parse_address(spec):
+    # "unix:/path", "host:port" or just a port on localhost
+    if spec.startswith("unix:"):
+        return socket.AF_UNIX, spec[5:]
+    host, _, port = spec.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _file_id(path):
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+def _clear_stale_socket(path):
+    # a socket file left behind by a host that died can be replaced; one a
+    # live host still answers on, or any other kind of file, cannot
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "not a socket, refusing to replace it", path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise OSError(errno.EADDRINUSE, "another host is already broadcasting here", path)
+
+
+def _records(fmt, rows):
+    return COUNT.pack(len(rows)) + b"".join(fmt.pack(*r) for r in rows)
+
+
+class _Client:
+    # one viewer's send queue. Frames are only ever dropped whole: a frame the
+    # socket has taken part of is always finished first, or the viewer would
+    # read the front of one frame glued to the next
+    __slots__ = ("sock", "out", "sizes", "sent", "need_key")
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.out = bytearray()
+        self.sizes = deque()  # lengths of the frames queued in out
+        self.sent = 0  # bytes of sizes[0] already on the wire
+        self.need_key = True
+
+    def queue(self, frame):
+        self.out += frame
+        self.sizes.append(len(frame))
+
+    def backlog(self):
+        # bytes queued behind the frame at the head, so a lone keyframe larger
+        # than MAX_BACKLOG still gets through
+        return len(self.out) - (self.sizes[0] - self.sent if self.sizes else 0)
+
+    def drop(self):
+        # discard queued frames, keeping the remainder of a partly sent one
+        if self.sent:
+            del self.out[self.sizes[0] - self.sent:]
+            self.sizes = deque([self.sizes[0]])
+        else:
+            self.out.clear()
+            self.sizes.clear()
+
+    def flush(self):
+        try:
+            n = self.sock.send(self.out)
+        except BlockingIOError:
+            return 0
+        del self.out[:n]
+        sent, sizes = self.sent + n, self.sizes
+        while sizes and sent >= sizes[0]:
+            sent -= sizes.popleft()
+        self.sent = sent
+        return n
+
+
+class Broadcaster:
+    # host side: non-blocking listener plus per-client send buffers, fed one
+    # publish() per simulation tick. Deltas are computed once and shared by
+    # every client; a client that falls behind drops its backlog and gets a
+    # keyframe instead.
+    def __init__(self, address, keyframe_ticks=KEYFRAME_TICKS):
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX:
+            _clear_stale_socket(addr)
+        self.server = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            if family == socket.AF_INET:
+                self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server.bind(addr)
+            self.server.listen()
+        except OSError:
+            self.server.close()
+            raise
+        self.server.setblocking(False)
+        # report the port actually bound, so "host:0" picks a free one
+        self.address = address if family == socket.AF_UNIX else "%s:%d" % self.server.getsockname()[:2]
+        self.path = addr if family == socket.AF_UNIX else None
+        # identity of the socket file we created; close() removes only that one
+        self.path_id = _file_id(addr) if self.path is not None else None
+        self.keyframe_ticks = keyframe_ticks
+        self.clients = {}  # socket -> _Client
+        self.sent_bytes = 0
+        self.frames = 0
+
+        # what the clients were last told
+        self.tilemap = None
+        self.tiles = None
+        self.emeralds = set()
+        self.bags = {}
+        self.watch = set()
+        self.mobs = b""
+        self.shots = b""
+        self.last_key = 0
+
+    def close(self):
+        for sock in self.clients:
+            sock.close()
+        self.clients.clear()
+        self.server.close()
+        if self.path is not None and _file_id(self.path) == self.path_id:
+            os.unlink(self.path)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            self.clients[sock] = _Client(sock)
+
+    def publish(self, sim):
+        self._accept()
+        if not self.clients:
+            self.tilemap = None  # nobody listening: start over with a keyframe
+            return
+        if sim.bag_watch is None:
+            sim.bag_watch = self.watch
+
+        tick = sim.ticks
+        level_changed = sim.tilemap is not self.tilemap or len(sim.emeralds) > len(self.emeralds)
+        resync = level_changed or tick - self.last_key >= self.keyframe_ticks
+        delta = None if resync else self._delta(sim)
+        key = None
+        if resync or any(c.need_key for c in self.clients.values()):
+            key = self._keyframe(sim)
+            self.last_key = tick
+
+        for sock, client in list(self.clients.items()):
+            if client.need_key or delta is None:
+                client.drop()
+                client.queue(key)
+                client.need_key = False
+            else:
+                client.queue(delta)
+            try:
+                self.sent_bytes += client.flush()
+            except OSError:
+                sock.close()
+                del self.clients[sock]
+                continue
+            if client.backlog() > MAX_BACKLOG:
+                client.drop()
+                client.need_key = True
+
+    def _hud(self, sim):
+        return HUD.pack(
+            sim.score, min(sim.lives, 0xFFFF), sim.level, sim.STATES.index(sim.state),
+            int(sim.player_x * Q), int(sim.player_y * Q), *sim.player_dir, sim.bonus_mode,
+        )
+
+    def _frame(self, kind, tick, payload):
+        self.frames += 1
+        return FRAME.pack(len(payload), kind, tick) + payload
+
+    def _bag(self, sim, b):
+        return b.seq, b.tx, b.ty, sim.BAG_STATES.index(b.state), int(b.offset_y * 256) & 0xFF
+
+    def _mobs(self, sim):
+        types = sim.MONSTER_TYPES
+        rows = [(int(m.x * Q), int(m.y * Q), types.index(m.type)) for m in sim.monsters if m.alive]
+        if sim.swarm is not None:
+            sw = sim.swarm
+            live = sw.alive[:sw.n]
+            xs = (sw.x[:sw.n][live] * Q).astype(int).tolist()
+            ys = (sw.y[:sw.n][live] * Q).astype(int).tolist()
+            rows.extend(zip(xs, ys, sw.type[:sw.n][live].tolist()))
+        return _records(MOB, rows)
+
+    def _shots(self, sim):
+        return _records(SHOT, [(int(s.x * Q), int(s.y * Q)) for s in sim.shots if s.active])
+
+    def _keyframe(self, sim):
+        self.tilemap = sim.tilemap
+        self.tiles = bytearray(sim.tilemap.cells)
+        self.emeralds = set(sim.emeralds)
+        self.bags = {b.seq: self._bag(sim, b) for b in sim.bags}
+        self.watch.clear()
+        self.mobs = self._mobs(sim)
+        self.shots = self._shots(sim)
+        tiles = zlib.compress(bytes(self.tiles), 1)
+        emeralds = sorted(self.emeralds)
+        return self._frame(KEYFRAME, sim.ticks, b"".join([
+            self._hud(sim),
+            SIZE.pack(sim.tilemap.w, sim.tilemap.h),
+            COUNT.pack(len(tiles)), tiles,
+            COUNT.pack(len(emeralds)), struct.pack(f"<{2 * len(emeralds)}H", *(c for e in emeralds for c in e)),
+            _records(BAG, list(self.bags.values())),
+            self.mobs,
+            self.shots,
+        ]))
+
+    def _delta(self, sim):
+        # tiles only ever get dug, so an index is the whole change
+        dug = sim.tilemap.diff(self.tiles)
+        for i in dug:
+            self.tiles[i] = 1
+
+        gone = []
+        if len(sim.emeralds) != len(self.emeralds):
+            gone = sorted(self.emeralds - sim.emeralds)
+            self.emeralds.difference_update(gone)
+
+        # only bags woken since the last tick can have changed; they stay
+        # watched until they have settled and been sent
+        changed, removed = [], []
+        for b in list(self.watch):
+            if sim.bag_grid.get((b.tx, b.ty)) is not b:
+                if self.bags.pop(b.seq, None) is not None:
+                    removed.append(b.seq)
+                self.watch.discard(b)
+                continue
+            rec = self._bag(sim, b)
+            if rec != self.bags.get(b.seq):
+                self.bags[b.seq] = rec
+                changed.append(rec)
+            elif not b.queued and b.state in (sim.BAG_STATES[0], sim.BAG_STATES[3]):
+                self.watch.discard(b)
+
+        mobs = self._mobs(sim)
+        shots = self._shots(sim)
+        parts = [
+            self._hud(sim),
+            COUNT.pack(len(dug)), struct.pack(f"<{len(dug)}I", *dug),
+            COUNT.pack(len(gone)), struct.pack(f"<{2 * len(gone)}H", *(c for e in gone for c in e)),
+            _records(BAG, changed),
+            COUNT.pack(len(removed)), struct.pack(f"<{len(removed)}I", *removed),
+        ]
+        for new, attr in ((mobs, "mobs"), (shots, "shots")):
+            if new == getattr(self, attr):
+                parts.append(COUNT.pack(UNCHANGED))
+            else:
+                setattr(self, attr, new)
+                parts.append(new)
+        return self._frame(DELTA, sim.ticks, b"".join(parts))
+
+
+class Spectator:
+    # client side: reassembles frames from the socket and applies them to a
+    # plain copy of the state; it runs none of the game rules
+    def __init__(self, address):
+        family, addr = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(addr)
+        self.buf = bytearray()
+        self.synced = False
+        self.tick = 0
+        self.w = self.h = 0
+        self.tiles = bytearray()
+        self.emeralds = set()
+        self.bags = {}
+        self.mobs = []
+        self.shots = []
+        self.hud = None
+        self.received = 0
+
+    def poll(self, timeout=0.0):
+        # read whatever arrived and apply every complete frame; False once the host is gone
+        while select.select([self.sock], [], [], timeout)[0]:
+            data = self.sock.recv(1 << 16)
+            if not data:
+                return False
+            self.received += len(data)
+            self.buf += data
+            timeout = 0.0
+        view = memoryview(self.buf)
+        off = 0
+        while len(self.buf) - off >= FRAME.size:
+            size, kind, tick = FRAME.unpack_from(view, off)
+            if len(self.buf) - off - FRAME.size < size:
+                break
+            start = off + FRAME.size
+            if kind == KEYFRAME:
+                self._keyframe(view, start)
+            elif self.synced:
+                self._delta(view, start)
+            self.tick = tick
+            off = start + size
+        view.release()
+        del self.buf[:off]
+        return True
+
+    def _hud(self, data, off):
+        self.hud = HUD.unpack_from(data, off)
+        return off + HUD.size
+
+    def _list(self, fmt, data, off):
+        (n,) = COUNT.unpack_from(data, off)
+        off += COUNT.size
+        if n == UNCHANGED:
+            return None, off
+        rows = [fmt.unpack_from(data, off + i * fmt.size) for i in range(n)]
+        return rows, off + n * fmt.size
+
+    def _ints(self, code, data, off):
+        (n,) = COUNT.unpack_from(data, off)
+        off += COUNT.size
+        vals = struct.unpack_from(f"<{n}{code}", data, off)
+        return vals, off + struct.calcsize(f"<{n}{code}")
+
+    def _keyframe(self, data, off):
+        off = self._hud(data, off)
+        self.w, self.h = SIZE.unpack_from(data, off)
+        off += SIZE.size
+        (n,) = COUNT.unpack_from(data, off)
+        off += COUNT.size
+        self.tiles = bytearray(zlib.decompress(data[off:off + n]))
+        off += n
+        emeralds, off = self._pairs(data, off)
+        self.emeralds = set(emeralds)
+        bags, off = self._list(BAG, data, off)
+        self.bags = {b[0]: b for b in bags}
+        self.mobs, off = self._list(MOB, data, off)
+        self.shots, off = self._list(SHOT, data, off)
+        self.synced = True
+
+    def _pairs(self, data, off):
+        (n,) = COUNT.unpack_from(data, off)
+        off += COUNT.size
+        flat = struct.unpack_from(f"<{2 * n}H", data, off)
+        return list(zip(flat[0::2], flat[1::2])), off + 4 * n
+
+    def _delta(self, data, off):
+        off = self._hud(data, off)
+        dug, off = self._ints("I", data, off)
+        for i in dug:
+            self.tiles[i] = 1
+        gone, off = self._pairs(data, off)
+        self.emeralds.difference_update(gone)
+        changed, off = self._list(BAG, data, off)
+        for b in changed:
+            self.bags[b[0]] = b
+        removed, off = self._ints("I", data, off)
+        for seq in removed:
+            self.bags.pop(seq, None)
+        mobs, off = self._list(MOB, data, off)
+        if mobs is not None:
+            self.mobs = mobs
+        shots, off = self._list(SHOT, data, off)
+        if shots is not None:
+            self.shots = shots
+
+    def render_text(self):
+        # one character per tile: # earth, . tunnel, * emerald, $ bag, M monster, o shot, @ player
+        grid = [["#" if self.tiles[y * self.w + x] == 0 else "." for x in range(self.w)] for y in range(self.h)]
+        for x, y in self.emeralds:
+            grid[y][x] = "*"
+        for _, x, y, _, _ in self.bags.values():
+            grid[y][x] = "$"
+        for x, y in self.shots:
+            grid[min(self.h - 1, y // Q)][min(self.w - 1, x // Q)] = "o"
+        for x, y, _ in self.mobs:
+            grid[(y + Q // 2) // Q][(x + Q // 2) // Q] = "M"
+        score, lives, level, _, px, py = self.hud[:6]
+        grid[(py + Q // 2) // Q][(px + Q // 2) // Q] = "@"
+        head = f"tick {self.tick}  SCORE {score:06d}  LIVES {lives}  LEVEL {level}  rx {self.received} B"
+        return "\n".join([head] + ["".join(row) for row in grid])
+
+
+def view_window(spec):
+    import pygame
+
+    from main import GRID_H, GRID_W, SCREEN_HEIGHT, SCREEN_WIDTH, TILE_SIZE, Simulation, Sprites
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption(f"Retro Digger Tribute - spectating {spec}")
+    sprites = Sprites()
+    font = pygame.font.SysFont("consolas", 22)
+    clock = pygame.time.Clock()
+    spec_state = Spectator(spec)
+    view_w, view_h = GRID_W * TILE_SIZE, GRID_H * TILE_SIZE
+    half = TILE_SIZE // 2
+    while spec_state.poll():
+        if any(ev.type == pygame.QUIT for ev in pygame.event.get()):
+            break
+        clock.tick(60)
+        if not spec_state.synced:
+            continue
+        s = spec_state
+        score, lives, level, _, px, py, dx, dy, bonus = s.hud
+        # centre the window on the player, clamped to the map
+        cam_x = min(max(0, px * TILE_SIZE // Q + half - view_w // 2), max(0, s.w * TILE_SIZE - view_w))
+        cam_y = min(max(0, py * TILE_SIZE // Q + half - view_h // 2), max(0, s.h * TILE_SIZE - view_h))
+        ox, oy = 32 - cam_x, 96 - cam_y
+        screen.fill((10, 10, 14))
+        screen.set_clip(pygame.Rect(32, 96, view_w, view_h))
+        for y in range(max(0, cam_y // TILE_SIZE), min(s.h, (cam_y + view_h) // TILE_SIZE + 1)):
+            for x in range(max(0, cam_x // TILE_SIZE), min(s.w, (cam_x + view_w) // TILE_SIZE + 1)):
+                color = (111, 72, 38) if s.tiles[y * s.w + x] == 0 else (28, 28, 32)
+                screen.fill(color, (ox + x * TILE_SIZE, oy + y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+        for x, y in s.emeralds:
+            screen.blit(sprites.emerald, (ox + x * TILE_SIZE, oy + y * TILE_SIZE))
+        for _, x, y, state, offset in s.bags.values():
+            look = sprites.bag[Simulation.BAG_STATES[state]]
+            screen.blit(look, (ox + x * TILE_SIZE, oy + y * TILE_SIZE + offset * TILE_SIZE // 256))
+        for x, y, t in s.mobs:
+            look = sprites.monster[Simulation.MONSTER_TYPES[t]]
+            screen.blit(*sprites.centered(look, ox + x * TILE_SIZE // Q + half, oy + y * TILE_SIZE // Q + half))
+        for x, y in s.shots:
+            screen.blit(*sprites.centered(sprites.shot, ox + x * TILE_SIZE // Q, oy + y * TILE_SIZE // Q))
+        phase = "blink_on" if bonus else "normal"
+        look = sprites.player.get((phase, (dx, dy)), sprites.player["normal", (1, 0)])
+        screen.blit(*sprites.centered(look, ox + px * TILE_SIZE // Q + half, oy + py * TILE_SIZE // Q + half))
+        screen.set_clip(None)
+        hud = f"SCORE {score:06d}   LIVES {lives}   LEVEL {level}   (spectating)"
+        screen.blit(font.render(hud, True, (246, 232, 182)), (24, 20))
+        pygame.display.flip()
+    pygame.quit()
+
+
+def view_text(spec, fps=10):
+    s = Spectator(spec)
+    while s.poll(1.0 / fps):
+        if s.synced:
+            sys.stdout.write("\x1b[H\x1b[2J" + s.render_text() + "\n")
+            sys.stdout.flush()
+        time.sleep(1.0 / fps)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Watch a game published with main.py --broadcast.")
+    ap.add_argument("address", help="host:port, port, or unix:/path")
+    ap.add_argument("--text", action="store_true", help="render as text in the terminal instead of a window")
+    args = ap.parse_args(argv)
+    if args.text:
+        view_text(args.address)
+    else:
+        view_window(args.address)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Vectorized headless environment for training bots against the game rules.
+
+    env = VecEnv(8)
+    obs = env.reset(seed=0)
+    obs, rewards, dones, infos = env.step(actions)   # actions: int array of len 8
+
+Observations live in buffers allocated once and filled in place each step;
+copy them if you need to keep a step's values.
+"""
+import os
+import time
+
+import numpy as np
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import GRID_H, GRID_W, InputLog, Simulation
+
+# action id -> (direction, shoot); direction None releases the stick
+ACTIONS = [(d, shoot) for shoot in (False, True) for d in InputLog.DIRS]
+
+# observation planes, one uint8 H x W layer each
+PLANES = ["tunnel", "emerald", "bag_rest", "bag_wobble", "bag_fall", "bag_gold", "nobbin", "hobbin"]
+BAG_PLANE = {state: PLANES.index("bag_" + state) for state in Simulation.BAG_STATES}
+MONSTER_PLANE = {mtype: PLANES.index(mtype) for mtype in Simulation.MONSTER_TYPES}
+EMERALD = PLANES.index("emerald")
+
+
+class VecEnv:
+    # N independent Simulations stepped in lockstep; finished games reset
+    # themselves with the next seed, so step() always returns live observations
+    def __init__(self, num_envs, width=GRID_W, height=GRID_H, level=1, ticks_per_step=1, max_ticks=None):
+        self.num_envs = num_envs
+        self.width = width
+        self.height = height
+        self.level = level
+        self.ticks_per_step = ticks_per_step
+        self.max_ticks = max_ticks
+        self.sims = [None] * num_envs
+        self.next_seed = 0
+
+        self.planes = np.zeros((num_envs, len(PLANES), height, width), dtype=np.uint8)
+        self.player = np.zeros((num_envs, 2), dtype=np.float32)
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        self.obs = {"planes": self.planes, "player": self.player}
+
+        # what the emerald plane was last built from, per env
+        self._tilemaps = [None] * num_envs
+        self._emerald_counts = [-1] * num_envs
+        self._scores = [0] * num_envs
+
+    @property
+    def action_count(self):
+        return len(ACTIONS)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.next_seed = seed
+        for i in range(self.num_envs):
+            self._reset_env(i)
+        self.rewards[:] = 0.0
+        self.dones[:] = False
+        return self.obs
+
+    def _reset_env(self, i):
+        sim = self.sims[i] = Simulation(self.next_seed, level=self.level, width=self.width, height=self.height)
+        self.next_seed += 1
+        sim.start()
+        self._scores[i] = sim.score
+        self._encode(i)
+
+    def step(self, actions):
+        infos = []
+        for i, sim in enumerate(self.sims):
+            direction, shoot = ACTIONS[actions[i]]
+            sim.set_direction(direction)
+            if shoot:
+                sim.shoot()
+            for _ in range(self.ticks_per_step):
+                sim.step()
+
+            self.rewards[i] = sim.score - self._scores[i]
+            self._scores[i] = sim.score
+            done = sim.state == "GAME_OVER" or (self.max_ticks is not None and sim.ticks >= self.max_ticks)
+            self.dones[i] = done
+            info = {"seed": sim.seed, "level": sim.level, "lives": sim.lives, "ticks": sim.ticks}
+            if done:
+                info["final_score"] = sim.score
+                self._reset_env(i)
+            else:
+                self._encode(i)
+            infos.append(info)
+        return self.obs, self.rewards, self.dones, infos
+
+    def _encode(self, i):
+        sim = self.sims[i]
+        planes = self.planes[i]
+        w = sim.grid_w
+        np.copyto(planes[0], np.frombuffer(sim.tilemap.cells, dtype=np.uint8).reshape(-1, w))
+
+        # emeralds only disappear, so the plane is redrawn only when one did or the level changed
+        if sim.tilemap is not self._tilemaps[i] or len(sim.emeralds) != self._emerald_counts[i]:
+            self._tilemaps[i] = sim.tilemap
+            self._emerald_counts[i] = len(sim.emeralds)
+            plane = planes[EMERALD]
+            plane.fill(0)
+            if sim.emeralds:
+                xs, ys = zip(*sim.emeralds)
+                plane[ys, xs] = 1
+
+        # bags and monsters are sparse: clear their planes and scatter the live ones
+        planes[EMERALD + 1:].fill(0)
+        for (x, y), b in sim.bag_grid.items():
+            planes[BAG_PLANE[b.state], y, x] = 1
+        for (x, y), ms in sim.monster_grid.items():
+            for m in ms:
+                if m.alive:
+                    planes[MONSTER_PLANE[m.type], y, x] = 1
+        self.player[i] = sim.player_x, sim.player_y
+
+
+def random_rollout(num_envs=16, steps=2000, seed=0):
+    # throughput smoke test: uniformly random actions
+    env = VecEnv(num_envs)
+    env.reset(seed)
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    for _ in range(steps):
+        env.step(rng.integers(env.action_count, size=num_envs))
+    elapsed = time.perf_counter() - started
+    print(f"env: {num_envs * steps / elapsed:.0f} env steps/s over {num_envs} envs")
+
+
+if __name__ == "__main__":
+    random_rollout()
@@ -0,0 +1,189 @@
+"""Seeded level layouts: generation, a solvability check and a layout cache.
+
+A layout is a pure function of (seed, width, height), so the cache can build
+upcoming levels on a worker thread and hand them out again on restart.
+"""
+import hashlib
+import queue
+import random
+import threading
+from collections import OrderedDict
+
+EMERALD_RATE = 0.12
+BAG_RATE = 0.05
+MIN_EMERALDS = 22
+CLEARANCE = 2  # no bags within this many tiles of the player start or monster spawn
+_REACHED = bytes.maketrans(b"\x00\x01\x02", b"\x00\x00\x01")
+
+
+def level_seed(seed, level):
+    # independent of the gameplay RNG, so a level looks the same however it was reached
+    digest = hashlib.blake2b(f"{seed}:{level}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class Layout:
+    # immutable result of generate(); shared between Simulations via the cache
+    def __init__(self, seed, width, height, tiles, emeralds, bags):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.tiles = tiles  # bytes, row-major, 0 = earth, 1 = tunnel
+        self.emeralds = emeralds
+        self.bags = bags
+        self.start = (1, 1)
+        self.spawn = (width - 2, 1)
+
+
+def generate(seed, width, height):
+    rng = random.Random(seed)
+    w, h = width, height
+    tiles = bytearray(w * h)
+    for y in range(1, h - 1):  # start column
+        tiles[y * w + 1] = 1
+    tiles[(h - 2) * w + 1:(h - 1) * w - 1] = b"\x01" * (w - 2)  # bottom corridor
+
+    start, spawn = (1, 1), (w - 2, 1)
+    emeralds = set()
+    bags = set()
+    for y in range(2, h - 2):
+        for x in range(2, w - 2):
+            r = rng.random()
+            if r < EMERALD_RATE:
+                emeralds.add((x, y))
+            elif r < EMERALD_RATE + BAG_RATE and not _near(x, y, start) and not _near(x, y, spawn):
+                bags.add((x, y))
+
+    # a bag over a tunnel would drop the moment the level starts
+    bags = {(x, y) for x, y in bags if tiles[(y + 1) * w + x] == 0}
+
+    # bags are walls for this check; emeralds sealed off by them are moved
+    reach = _reachable(w, h, start, bags)
+    emeralds = {e for e in emeralds if reach[e[1] * w + e[0]]}
+    want = min(MIN_EMERALDS, (w - 4) * (h - 4) // 2) - len(emeralds)
+    if want > 0:
+        free = [(x, y) for y in range(2, h - 2) for x in range(2, w - 2)
+                if reach[y * w + x] and (x, y) not in bags and (x, y) not in emeralds]
+        emeralds.update(rng.sample(free, min(want, len(free))))
+
+    layout = Layout(seed, w, h, bytes(tiles), tuple(sorted(emeralds)), tuple(sorted(bags)))
+    issues = _problems(layout, reach)
+    if issues:
+        raise RuntimeError(f"level {seed} {w}x{h}: {issues[0]}")
+    return layout
+
+
+def _near(x, y, p):
+    return abs(x - p[0]) <= CLEARANCE and abs(y - p[1]) <= CLEARANCE
+
+
+def _reachable(w, h, start, walls):
+    # tiles the player can dig to from start without moving any bag, as a
+    # w * h bytes of 0/1 flags; searched on a grid padded with a wall ring
+    pw = w + 2
+    seen = bytearray(pw * (h + 2))
+    seen[:pw] = seen[-pw:] = b"\x01" * pw
+    seen[::pw] = seen[pw - 1::pw] = b"\x01" * (h + 2)
+    for x, y in walls:
+        seen[(y + 1) * pw + x + 1] = 1
+    i = (start[1] + 1) * pw + start[0] + 1
+    seen[i] = 2
+    frontier = [i]
+    while frontier:
+        ring = []
+        for i in frontier:
+            for j in (i + 1, i - 1, i + pw, i - pw):
+                if not seen[j]:
+                    seen[j] = 2
+                    ring.append(j)
+        frontier = ring
+    rows = b"".join(seen[y * pw + 1:y * pw + 1 + w] for y in range(1, h + 1))
+    return rows.translate(_REACHED)
+
+
+def problems(layout):
+    # everything that would make a layout unfair; empty means solvable
+    return _problems(layout, _reachable(layout.width, layout.height, layout.start, layout.bags))
+
+
+def _problems(layout, reach):
+    w = layout.width
+    bags = set(layout.bags)
+    out = []
+    if not layout.emeralds:
+        out.append("no emeralds")
+    if bags & set(layout.emeralds):
+        out.append("bag and emerald share a tile")
+    for x, y in layout.bags:
+        if _near(x, y, layout.start) or _near(x, y, layout.spawn):
+            out.append(f"bag at {(x, y)} next to a spawn point")
+        elif layout.tiles[(y + 1) * w + x] == 1:
+            out.append(f"bag at {(x, y)} falls at level start")
+    out.extend(f"emerald at {e} unreachable" for e in layout.emeralds if not reach[e[1] * w + e[0]])
+    return out
+
+
+class LevelCache:
+    # layouts keyed by (seed, width, height); prefetch() builds on a daemon
+    # thread, get() returns a cached layout, waits for one in flight, or
+    # generates inline
+    def __init__(self, capacity=8, background=True):
+        self.capacity = capacity
+        self.background = background
+        self.layouts = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.jobs = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, seed, width, height):
+        key = (seed, width, height)
+        with self.lock:
+            layout = self.layouts.get(key)
+            if layout is not None:
+                self.layouts.move_to_end(key)
+                self.hits += 1
+                return layout
+            done = self.pending.get(key)
+            self.misses += 1
+        if done is not None:
+            done.wait()
+            with self.lock:
+                layout = self.layouts.get(key)
+            if layout is not None:
+                return layout
+        layout = generate(seed, width, height)
+        self._store(key, layout)
+        return layout
+
+    def prefetch(self, seed, width, height):
+        if not self.background:
+            return
+        key = (seed, width, height)
+        with self.lock:
+            if key in self.layouts or key in self.pending:
+                return
+            self.pending[key] = threading.Event()
+            if self.jobs is None:
+                self.jobs = queue.Queue()
+                threading.Thread(target=self._work, daemon=True).start()
+        self.jobs.put(key)
+
+    def _work(self):
+        while True:
+            key = self.jobs.get()
+            try:
+                self._store(key, generate(*key))
+            finally:
+                with self.lock:
+                    done = self.pending.pop(key, None)
+                if done is not None:
+                    done.set()
+
+    def _store(self, key, layout):
+        with self.lock:
+            self.layouts[key] = layout
+            self.layouts.move_to_end(key)
+            while len(self.layouts) > self.capacity:
+                self.layouts.popitem(last=False)
@@ -1,17 +1,39 @@
+import argparse
+import csv
+import hashlib
+import heapq
+import json
 import math
 import random
+import struct
+import sys
+import threading
+import time
 from array import array
-from collections import deque
+from collections import OrderedDict, deque
 from pathlib import Path
 
 import pygame
 
+from broadcast import Broadcaster
+from levelgen import LevelCache, level_seed
+
+try:
+    import numpy as np
+except ImportError:  # synth falls back to the pure-Python sample loop
+    np = None
+
 SCREEN_WIDTH, SCREEN_HEIGHT = 960, 640
 FPS = 60
 
 TILE_SIZE = 32
-GRID_W, GRID_H = 20, 14
+GRID_W, GRID_H = 20, 14  # default map size, also the on-screen playfield in tiles
 GRID_X, GRID_Y = 32, 96
+MAX_GRID = 1024
+CHUNK = 8  # terrain is cached in CHUNK x CHUNK tile surfaces, built on first sight
+CHUNK_CACHE = 48
+
+NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1))
 
 DIR_KEYS = {
     pygame.K_UP: (0, -1),
@@ -36,6 +58,85 @@ AUDIO_NAMES = [
     "sfx_level_clear",
 ]
 
+# mixer channels reserved per category as (first channel, count)
+CHANNEL_GROUPS = {"music": (0, 1), "critical": (1, 3), "sfx": (4, 6), "ambient": (10, 3)}
+# name -> (category, priority, max simultaneous voices, cooldown in seconds)
+VOICE_RULES = {
+    "music_title": ("music", 9, 1, 0.0),
+    "music_game": ("music", 9, 1, 0.0),
+    "sfx_player_die": ("critical", 8, 1, 0.0),
+    "sfx_level_clear": ("critical", 8, 1, 0.0),
+    "sfx_bonus_start": ("critical", 6, 1, 0.0),
+    "sfx_bonus_end": ("critical", 6, 1, 0.0),
+    "sfx_gold_collect": ("critical", 5, 1, 0.0),
+    "sfx_monster_die": ("sfx", 4, 3, 0.0),
+    "sfx_gold_drop": ("sfx", 3, 2, 0.0),
+    "sfx_emerald": ("sfx", 3, 2, 0.05),
+    "sfx_shoot": ("sfx", 2, 2, 0.0),
+    "sfx_gold_wobble": ("ambient", 1, 2, 0.15),
+    "sfx_dig": ("ambient", 0, 1, 0.06),
+}
+
+
+class ChannelPool:
+    # every mixer channel is reserved and split into per-category groups. A
+    # sound plays on a free channel of its group, else steals the oldest
+    # lowest-priority voice there if it outranks it, else is dropped; per-name
+    # voice limits and cooldowns keep bursts from reaching the mixer at all
+    def __init__(self, groups=CHANNEL_GROUPS, rules=VOICE_RULES):
+        total = max(first + n for first, n in groups.values())
+        pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)
+        pygame.mixer.stop()  # the pool only tracks voices it started itself
+        self.rules = rules
+        self.groups = {cat: list(range(first, first + n)) for cat, (first, n) in groups.items()}
+        self.channels = [pygame.mixer.Channel(i) for i in range(total)]
+        self.voices = [None] * total  # (name, priority, started) of the last sound per channel
+        self.last_start = {}
+        self.stats = dict.fromkeys(["played", "stolen", "limited", "cooldown", "dropped"], 0)
+        self.peak = dict.fromkeys(groups, 0)
+
+    def play(self, name, snd, now=None):
+        category, priority, limit, cooldown = self.rules.get(name, ("sfx", 1, 2, 0.0))
+        now = time.perf_counter() if now is None else now
+        if now - self.last_start.get(name, -cooldown) < cooldown:
+            self.stats["cooldown"] += 1
+            return None
+        group = self.groups[category]
+        busy = [i for i in group if self.channels[i].get_busy()]
+        if sum(1 for i in busy if self.voices[i][0] == name) >= limit:
+            self.stats["limited"] += 1
+            return None
+
+        free = next((i for i in group if i not in busy), None)
+        if free is None:
+            victim = min(busy, key=lambda i: self.voices[i][1:])
+            if self.voices[victim][1] > priority:
+                self.stats["dropped"] += 1
+                return None
+            self.channels[victim].stop()
+            self.stats["stolen"] += 1
+            free = victim
+        else:
+            busy.append(free)
+
+        ch = self.channels[free]
+        ch.play(snd)
+        self.voices[free] = (name, priority, now)
+        self.last_start[name] = now
+        self.stats["played"] += 1
+        self.peak[category] = max(self.peak[category], len(busy))
+        return ch
+
+    def stop(self, category):
+        for i in self.groups[category]:
+            self.channels[i].stop()
+
+    def usage(self):
+        # busy voices per category right now, plus lifetime peaks and counters
+        active = {cat: sum(1 for i in group if self.channels[i].get_busy()) for cat, group in self.groups.items()}
+        return {"active": active, "peak": dict(self.peak), **self.stats}
+
 
 class AudioManager:
     def __init__(self):
@@ -53,33 +154,79 @@ class AudioManager:
         self.sfx_cache: dict[str, pygame.mixer.Sound] = {}
         self.current_music = None
 
-        for name in AUDIO_NAMES:
-            path = self._resolve(name)
-            if not path:
-                continue
+        self.channels = ChannelPool()
+
+        # every synthesized fallback is built once up front, never on a miss mid-game;
+        # tone sequences are joined into one Sound so they take a single voice
+        self.synth_bank: dict[str, pygame.mixer.Sound] = {}
+        self.synth_music: dict[str, pygame.mixer.Sound] = {}
+        self._warm_synth_bank()
+
+        # music streams from disk anyway; sfx files decode on a worker thread and
+        # play_sfx uses the synth bank until a file is ready
+        self.load_ms = None
+        sfx_paths = {}
+        for name, path in self._scan().items():
+            if name.startswith("music_"):
+                self.music_paths[name] = path
+            else:
+                sfx_paths[name] = path
+        self.loader = threading.Thread(target=self._load_sfx, args=(sfx_paths,), daemon=True)
+        self.loader.start()
+
+    def _scan(self):
+        # one directory listing per base instead of probing every name/extension
+        found = {}
+        for base in (self.fallback, self.original):
+            for ext in (".ogg", ".wav"):
+                for p in base.glob(f"*{ext}"):
+                    if p.stem in AUDIO_NAMES:
+                        found[p.stem] = p
+        return found
+
+    def _load_sfx(self, paths):
+        started = time.perf_counter()
+        for name, path in paths.items():
             try:
-                if name.startswith("music_"):
-                    self.music_paths[name] = path
-                else:
-                    snd = pygame.mixer.Sound(str(path))
-                    snd.set_volume(self.sfx_volume)
-                    self.sfx_cache[name] = snd
+                snd = pygame.mixer.Sound(str(path))
             except pygame.error:
-                pass
-
-    def _resolve(self, name: str):
-        for base in (self.original, self.fallback):
-            for ext in (".wav", ".ogg"):
-                p = base / f"{name}{ext}"
-                if p.exists():
-                    return p
-        return None
+                continue
+            snd.set_volume(self.sfx_volume)
+            self.sfx_cache[name] = snd
+        self.load_ms = (time.perf_counter() - started) * 1000
+        if paths:
+            print(f"audio: {len(self.sfx_cache)}/{len(paths)} sfx files decoded in {self.load_ms:.0f} ms")
 
     def _tone(self, freq=440.0, duration=0.1, wave="square"):
         sr = 44100
         n = max(1, int(sr * duration))
-        buf = array("h")
         amp = int(32767 * 0.35)
+        if np is not None:
+            buf = self._tone_samples_np(freq, sr, n, wave, amp)
+        else:
+            buf = self._tone_samples(freq, sr, n, wave, amp)
+        snd = pygame.mixer.Sound(buffer=buf)
+        snd.set_volume(self.sfx_volume)
+        return snd
+
+    def _tone_samples_np(self, freq, sr, n, wave, amp):
+        i = np.arange(n, dtype=np.float64)
+        t = i / sr
+        phase = (t * freq) % 1.0
+        if wave == "square":
+            val = np.where(phase < 0.5, 1.0, -1.0)
+        elif wave == "triangle":
+            val = 4.0 * np.abs(phase - 0.5) - 1.0
+        elif wave == "saw":
+            val = 2.0 * phase - 1.0
+        else:
+            val = np.sin(2 * math.pi * freq * t)
+        val *= 1.0 - i / n
+        val *= amp
+        return val.astype(np.int16)
+
+    def _tone_samples(self, freq, sr, n, wave, amp):
+        buf = array("h")
         for i in range(n):
             t = i / sr
             phase = (t * freq) % 1.0
@@ -93,7 +240,19 @@ class AudioManager:
                 val = math.sin(2 * math.pi * freq * t)
             env = 1.0 - i / n
             buf.append(int(val * env * amp))
-        snd = pygame.mixer.Sound(buffer=buf.tobytes())
+        return buf
+
+    def _warm_synth_bank(self):
+        for name in AUDIO_NAMES:
+            if name.startswith("music_"):
+                self.synth_music[name] = self._sequence(self._music_tones(name))
+            elif name == "sfx_level_clear":
+                self.synth_bank[name] = self._sequence(self._level_clear_tones())
+            else:
+                self.synth_bank[name] = self._synth_sfx(name)
+
+    def _sequence(self, tones):
+        snd = pygame.mixer.Sound(buffer=b"".join(t.get_raw() for t in tones))
         snd.set_volume(self.sfx_volume)
         return snd
 
@@ -113,31 +272,22 @@ class AudioManager:
         f, d, w = spec.get(name, (440, 0.1, "square"))
         return self._tone(f, d, w)
 
-    def _synth_music(self, name: str):
+    def _music_tones(self, name: str):
         # tiny fallback jingle, no external assets
         base = 146 if name == "music_game" else 180
         seq = [1, 1.25, 1.5, 2, 1.5, 1.25, 1, 0.75]
-        for i, m in enumerate(seq):
-            s = self._tone(base * m, 0.18, "square" if i % 2 else "triangle")
-            s.set_volume(self.music_volume * 0.5)
-            s.play(maxtime=180)
+        return [self._tone(base * m, 0.18, "square" if i % 2 else "triangle") for i, m in enumerate(seq)]
 
-    def _synth_level_clear(self):
+    def _level_clear_tones(self):
         sequence = [523.25, 659.25, 783.99, 1046.5]
-        for i, freq in enumerate(sequence):
-            tone = self._tone(freq, 0.14 + i * 0.015, "triangle")
-            tone.set_volume(self.sfx_volume * 0.9)
-            tone.play(maxtime=220)
+        return [self._tone(freq, 0.14 + i * 0.015, "triangle") for i, freq in enumerate(sequence)]
 
-    def play_level_clear(self):
-        if not self.sfx_enabled:
-            return
-        snd = self.sfx_cache.get("sfx_level_clear")
-        if snd is not None:
-            snd.set_volume(self.sfx_volume)
-            snd.play()
-        else:
-            self._synth_level_clear()
+    def _synth_music(self, name: str):
+        snd = self.synth_music.get(name)
+        if snd is None:
+            snd = self.synth_music[name] = self._sequence(self._music_tones(name))
+        snd.set_volume(self.music_volume * 0.5)
+        self.channels.play(name, snd)
 
     def play_music(self, name: str):
         self.current_music = name
@@ -157,16 +307,24 @@ class AudioManager:
 
     def stop_music(self):
         pygame.mixer.music.stop()
+        self.channels.stop("music")
 
     def play_sfx(self, name: str):
         if not self.sfx_enabled:
             return
-        snd = self.sfx_cache.get(name)
+        snd = self.sfx_cache.get(name) or self.synth_bank.get(name)
         if snd is None:
-            snd = self._synth_sfx(name)
-            self.sfx_cache[name] = snd
-        snd.set_volume(self.sfx_volume)
-        snd.play()
+            snd = self.synth_bank[name] = self._synth_sfx(name)
+            snd.set_volume(self.sfx_volume)
+        self.channels.play(name, snd)
+
+    def on_events(self, events):
+        # EventBus subscriber: at most one mixer call per event kind and frame
+        for kind in events:
+            if kind == "game_over":
+                self.stop_music()
+            else:
+                self.play_sfx("sfx_" + kind)
 
     def toggle_music(self):
         self.music_enabled = not self.music_enabled
@@ -183,11 +341,236 @@ class AudioManager:
         pygame.mixer.music.set_volume(self.music_volume)
 
     def adjust_sfx(self, d: float):
+        # volume is set on the Sounds here, not on every play
         self.sfx_volume = max(0.0, min(1.0, self.sfx_volume + d))
+        for snd in list(self.sfx_cache.values()) + list(self.synth_bank.values()):
+            snd.set_volume(self.sfx_volume)
+
+
+class TileGrid:
+    # flat row-major byte grid, 0 = earth, 1 = tunnel
+    def __init__(self, w, h, fill=0):
+        self.w = w
+        self.h = h
+        self.cells = bytearray([fill]) * (w * h)
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def __getitem__(self, pos):
+        x, y = pos
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            raise IndexError(f"tile {pos} outside {self.w}x{self.h} grid")
+        return self.cells[y * self.w + x]
+
+    def __setitem__(self, pos, value):
+        x, y = pos
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            raise IndexError(f"tile {pos} outside {self.w}x{self.h} grid")
+        self.cells[y * self.w + x] = value
+
+    def get(self, x, y, default=None):
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return self.cells[y * self.w + x]
+        return default
+
+    def view(self):
+        return memoryview(self.cells)
+
+    def row(self, y):
+        return self.view()[y * self.w:(y + 1) * self.w]
+
+    def column(self, x):
+        return self.view()[x::self.w]
+
+    def fill(self, value, x=0, y=0, w=None, h=None):
+        # the rect is clipped to the grid, so it never spills into the next row
+        x1 = self.w if w is None else min(self.w, x + w)
+        y1 = self.h if h is None else min(self.h, y + h)
+        x, y = max(0, x), max(0, y)
+        if x >= x1 or y >= y1:
+            return
+        run = bytes([value]) * (x1 - x)
+        for ry in range(y, y1):
+            i = ry * self.w
+            self.cells[i + x:i + x1] = run
+
+    def copy_from(self, other):
+        self.cells[:] = other.cells
+
+    def snapshot(self):
+        return bytes(self.cells)
+
+    def restore(self, snap):
+        self.cells[:] = snap
+
+    def diff(self, snap):
+        # indices changed since snap; unchanged rows are skipped with one compare each
+        out = []
+        cells, w = self.cells, self.w
+        for ry in range(self.h):
+            i = ry * w
+            if cells[i:i + w] != snap[i:i + w]:
+                out.extend(j for j in range(i, i + w) if cells[j] != snap[j])
+        return out
+
+
+class Sprites:
+    # every entity look rasterized once at startup, drawing is a single blit
+
+    BAG_COLORS = {
+        "rest": ((178, 125, 58), (110, 74, 30)),
+        "wobble": ((200, 145, 70), (125, 85, 40)),
+        "fall": ((178, 125, 58), (110, 74, 30)),
+        "gold": ((245, 195, 55), (180, 120, 30)),
+    }
+    MONSTER_COLORS = {
+        "nobbin": ((228, 72, 72), (140, 35, 35), (255, 145, 145)),
+        "hobbin": ((150, 80, 226), (85, 45, 130), (210, 170, 255)),
+    }
+    PLAYER_COLORS = {
+        "normal": ((255, 245, 120), (145, 115, 30)),
+        "blink_on": ((255, 255, 255), (220, 220, 220)),
+        "blink_off": ((255, 255, 155), (145, 115, 30)),
+    }
+
+    def __init__(self):
+        self.half = TILE_SIZE // 2
+        self.bag = {state: self._bag(*cols) for state, cols in self.BAG_COLORS.items()}
+        self.monster = {mtype: self._monster(*cols) for mtype, cols in self.MONSTER_COLORS.items()}
+        self.player = {
+            (phase, d): self._player(*cols, d)
+            for phase, cols in self.PLAYER_COLORS.items()
+            for d in DIR_KEYS.values()
+        }
+        self.shot = self._shot()
+        self.emerald = self._emerald()
+        self.cherry = self._cherry()
+
+    def _canvas(self):
+        return pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+
+    def centered(self, sprite, px, py):
+        return sprite, (int(px) - self.half, int(py) - self.half)
+
+    def _bag(self, col1, col2):
+        surf = self._canvas()
+        rect = pygame.Rect(4, 5, TILE_SIZE - 8, TILE_SIZE - 10)
+        pygame.draw.rect(surf, col1, rect, border_radius=6)
+        pygame.draw.rect(surf, col2, rect, 2, border_radius=6)
+        pygame.draw.line(surf, col2, (rect.left + 3, rect.top + 7), (rect.right - 3, rect.top + 7), 1)
+        return surf.convert_alpha()
+
+    def _monster(self, main, shade, glow):
+        surf = self._canvas()
+        c = self.half
+        body = [(c - 10, c + 8), (c - 10, c - 2), (c - 6, c - 8), (c + 6, c - 8), (c + 10, c - 2), (c + 10, c + 8)]
+        pygame.draw.polygon(surf, (20, 16, 24), body)
+        pygame.draw.polygon(surf, main, body)
+        pygame.draw.polygon(surf, shade, body, 2)
+
+        for wave in (-7, -2, 3, 8):
+            pygame.draw.circle(surf, main, (c + wave, c + 9), 3)
+            pygame.draw.circle(surf, shade, (c + wave, c + 9), 1)
+
+        pygame.draw.circle(surf, (245, 245, 255), (c - 4, c - 2), 3)
+        pygame.draw.circle(surf, (245, 245, 255), (c + 4, c - 2), 3)
+        pygame.draw.circle(surf, glow, (c - 2, c - 2), 1)
+        pygame.draw.circle(surf, glow, (c + 2, c - 2), 1)
+        pygame.draw.circle(surf, (15, 15, 20), (c - 4, c - 1), 1)
+        pygame.draw.circle(surf, (15, 15, 20), (c + 4, c - 1), 1)
+        return surf.convert_alpha()
+
+    def _player(self, body, border, direction):
+        surf = self._canvas()
+        c = self.half
+        pygame.draw.circle(surf, border, (c, c), 12)
+        pygame.draw.circle(surf, body, (c, c), 10)
+
+        dx, dy = direction
+        pygame.draw.circle(surf, (255, 180, 50), (c + dx * 10, c + dy * 10), 4)
+        pygame.draw.circle(surf, (20, 20, 20), (c + (3 if dx >= 0 else -3), c - 3), 2)
+        return surf.convert_alpha()
+
+    def _shot(self):
+        surf = self._canvas()
+        pygame.draw.circle(surf, (255, 230, 90), (self.half, self.half), 4)
+        pygame.draw.circle(surf, (255, 170, 40), (self.half, self.half), 2)
+        return surf.convert_alpha()
+
+    def _emerald(self):
+        surf = self._canvas()
+        c = self.half
+        pts = [(c, c - 9), (c + 8, c), (c, c + 9), (c - 8, c)]
+        pygame.draw.polygon(surf, (20, 235, 190), pts)
+        pygame.draw.polygon(surf, (10, 100, 80), pts, 1)
+        return surf.convert_alpha()
+
+    def _cherry(self):
+        surf = self._canvas()
+        c = self.half
+        pygame.draw.circle(surf, (220, 50, 70), (c - 4, c), 7)
+        pygame.draw.circle(surf, (220, 50, 70), (c + 4, c), 7)
+        pygame.draw.circle(surf, (255, 120, 150), (c - 6, c - 2), 2)
+        pygame.draw.circle(surf, (255, 120, 150), (c + 2, c - 2), 2)
+        pygame.draw.line(surf, (30, 180, 80), (c, c - 8), (c + 7, c - 14), 2)
+        return surf.convert_alpha()
+
+
+class TextCache:
+    # rendered text keyed by (font, text, color, background); dynamic strings
+    # are LRU-evicted, static() ones are pinned and rendered exactly once
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.pinned = {}
+
+    def render(self, font, text, color, background=None):
+        key = (font, text, color, background)
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.entries.move_to_end(key)
+            return surf
+        surf = self.entries[key] = font.render(text, True, color, background)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return surf
+
+    def static(self, font, text, color):
+        key = (font, text, color)
+        surf = self.pinned.get(key)
+        if surf is None:
+            surf = self.pinned[key] = font.render(text, True, color)
+        return surf
+
+
+class EntityPool:
+    # free list of retired entities: acquire() re-initializes one in place
+    # through its reset() and only allocates when the list is empty
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.allocated = 0
+
+    def acquire(self, *args):
+        if self.free:
+            e = self.free.pop()
+            e.reset(*args)
+            return e
+        self.allocated += 1
+        return self.cls(*args)
+
+    def release(self, e):
+        self.free.append(e)
 
 
 class Shot:
+    __slots__ = ("x", "y", "direction", "speed", "active")
+
     def __init__(self, tx, ty, direction):
+        self.reset(tx, ty, direction)
+
+    def reset(self, tx, ty, direction):
         self.x = tx + 0.5
         self.y = ty + 0.5
         self.direction = direction
@@ -202,22 +585,25 @@ class Shot:
         self.y += self.direction[1] * self.speed * dt
         tx, ty = self.tile()
 
-        if not game.in_bounds(tx, ty) or game.tilemap[ty][tx] == 0:
+        if game.tilemap.get(tx, ty, 0) == 0:
             self.active = False
             return
 
-        for m in game.monsters:
-            if m.alive and m.tile() == (tx, ty):
+        for m in game.monsters_at(tx, ty):
+            if m.alive:
                 m.alive = False
                 self.active = False
                 game.monster_killed(by_bonus=False)
-                break
+                return
 
-    def draw(self, surf):
-        px = GRID_X + self.x * TILE_SIZE
-        py = GRID_Y + self.y * TILE_SIZE
-        pygame.draw.circle(surf, (255, 230, 90), (int(px), int(py)), 4)
-        pygame.draw.circle(surf, (255, 170, 40), (int(px), int(py)), 2)
+        if game.swarm is not None and game.swarm.kill_at(tx, ty, 1):
+            self.active = False
+            game.monster_killed(by_bonus=False)
+
+    def sprite(self, sprites, x=None, y=None):
+        px = (self.x if x is None else x) * TILE_SIZE
+        py = (self.y if y is None else y) * TILE_SIZE
+        return sprites.centered(sprites.shot, px, py)
 
 
 class Bag:
@@ -226,13 +612,20 @@ class Bag:
     FALL = "fall"
     GOLD = "gold"
 
+    __slots__ = ("tx", "ty", "state", "timer", "offset_y", "fall_tiles", "seq", "queued")
+
     def __init__(self, tx, ty):
+        self.reset(tx, ty)
+
+    def reset(self, tx, ty):
         self.tx = tx
         self.ty = ty
         self.state = Bag.REST
         self.timer = 0.0
         self.offset_y = 0.0
         self.fall_tiles = 0
+        self.seq = 0  # position in the bag list, fixes the update order
+        self.queued = False
 
     def tile(self):
         return self.tx, self.ty
@@ -248,7 +641,7 @@ class Bag:
         if self.state == Bag.REST and not support:
             self.state = Bag.WOBBLE
             self.timer = 0.6
-            game.audio.play_sfx("sfx_gold_wobble")
+            game.events.emit("gold_wobble")
         elif self.state == Bag.WOBBLE:
             if support:
                 self.state = Bag.REST
@@ -258,12 +651,14 @@ class Bag:
                     self.state = Bag.FALL
                     self.offset_y = 0.0
                     self.fall_tiles = 0
-                    game.audio.play_sfx("sfx_gold_drop")
+                    game.nav_version += 1
+                    game.wake_above(self.tx, self.ty)
+                    game.events.emit("gold_drop")
         elif self.state == Bag.FALL:
             self.offset_y += 8.6 * dt
             while self.offset_y >= 1.0:
                 self.offset_y -= 1.0
-                self.ty += 1
+                game.move_bag(self, self.tx, self.ty + 1)
                 self.fall_tiles += 1
                 game.crush_at(self.tx, self.ty)
 
@@ -271,34 +666,30 @@ class Bag:
                     self.state = Bag.GOLD if self.fall_tiles >= 2 else Bag.REST
                     self.offset_y = 0.0
                     self.fall_tiles = 0
+                    game.nav_version += 1
                     break
 
-    def draw(self, surf):
-        px = GRID_X + self.tx * TILE_SIZE
-        py = GRID_Y + (self.ty + self.offset_y) * TILE_SIZE
+    def sprite(self, sprites):
+        px = self.tx * TILE_SIZE
+        py = (self.ty + self.offset_y) * TILE_SIZE
+        return sprites.bag[self.state], (px, int(py))
 
-        if self.state == Bag.GOLD:
-            col1, col2 = (245, 195, 55), (180, 120, 30)
-        elif self.state == Bag.WOBBLE:
-            col1, col2 = (200, 145, 70), (125, 85, 40)
-        else:
-            col1, col2 = (178, 125, 58), (110, 74, 30)
 
-        rect = pygame.Rect(px + 4, py + 5, TILE_SIZE - 8, TILE_SIZE - 10)
-        pygame.draw.rect(surf, col1, rect, border_radius=6)
-        pygame.draw.rect(surf, col2, rect, 2, border_radius=6)
-        pygame.draw.line(surf, col2, (rect.left + 3, rect.top + 7), (rect.right - 3, rect.top + 7), 1)
+class Monster:
+    __slots__ = ("x", "y", "target", "type", "speed", "alive", "transform_timer", "cell")
 
+    def __init__(self, tx, ty, mtype="nobbin", speed=2.8, rng=random):
+        self.reset(tx, ty, mtype, speed, rng)
 
-class Monster:
-    def __init__(self, tx, ty, mtype="nobbin", speed=2.8):
+    def reset(self, tx, ty, mtype="nobbin", speed=2.8, rng=random):
         self.x = float(tx)
         self.y = float(ty)
         self.target = (tx, ty)
         self.type = mtype
         self.speed = speed
         self.alive = True
-        self.transform_timer = random.uniform(8.0, 14.0)
+        self.transform_timer = rng.uniform(8.0, 14.0)
+        self.cell = self.tile()
 
     def tile(self):
         return int(self.x + 0.5), int(self.y + 0.5)
@@ -324,8 +715,10 @@ class Monster:
             self.y += dy / dist * step
 
         tx, ty = self.tile()
-        if self.type == "hobbin" and game.in_bounds(tx, ty) and game.tilemap[ty][tx] == 0:
-            game.tilemap[ty][tx] = 1
+        if (tx, ty) != self.cell:
+            game.move_monster(self, tx, ty)
+        if self.type == "hobbin" and game.tilemap.get(tx, ty, 1) == 0:
+            game.dig(tx, ty)
 
         if (tx, ty) == game.player_tile():
             if game.bonus_mode:
@@ -341,64 +734,544 @@ class Monster:
             return cur
 
         if game.bonus_mode:
-            return max(nbs, key=lambda p: game.manhattan(p, game.player_tile()))
+            return max(nbs, key=lambda p: game.path_distance(p, self.type))
+
+        nxt = game.path_next(cur, self.type)
+        return nxt if nxt else game.rng.choice(nbs)
+
+    def sprite(self, sprites, x=None, y=None):
+        px = (self.x if x is None else x) * TILE_SIZE + TILE_SIZE // 2
+        py = (self.y if y is None else y) * TILE_SIZE + TILE_SIZE // 2
+        return sprites.centered(sprites.monster[self.type], px, py)
+
+
+class MonsterSwarm:
+    # struct-of-arrays monsters for swarm levels: the Monster rules run as
+    # whole-array operations per tick. Dead slots are compacted away once
+    # they make up half the arrays.
+    TYPES = ["nobbin", "hobbin"]
+    DX = np.array([dx for dx, _ in NEIGHBORS]) if np is not None else None
+    DY = np.array([dy for _, dy in NEIGHBORS]) if np is not None else None
+
+    def __init__(self, capacity=64):
+        self.n = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.tx = np.zeros(capacity, dtype=np.int64)
+        self.ty = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity)
+        self.type = np.zeros(capacity, dtype=np.uint8)
+        self.timer = np.zeros(capacity)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.dead = 0
+        self._bags = None  # (nav_version, tilemap, solid-bag mask)
+
+    FIELDS = ["x", "y", "tx", "ty", "speed", "type", "timer", "alive"]
+
+    def __len__(self):
+        return self.n - self.dead
+
+    def add(self, tx, ty, speed, timers):
+        k = len(timers)
+        if self.n + k > len(self.x):
+            cap = max(2 * len(self.x), self.n + k)
+            for name in self.FIELDS:
+                old = getattr(self, name)
+                new = np.zeros(cap, dtype=old.dtype)
+                new[:self.n] = old[:self.n]
+                setattr(self, name, new)
+        sl = slice(self.n, self.n + k)
+        self.x[sl], self.y[sl] = tx, ty
+        self.tx[sl], self.ty[sl] = tx, ty
+        self.speed[sl] = speed
+        self.type[sl] = 0
+        self.timer[sl] = timers
+        self.alive[sl] = True
+        self.n += k
+
+    def compact(self):
+        keep = np.flatnonzero(self.alive[:self.n])
+        for name in self.FIELDS:
+            arr = getattr(self, name)
+            arr[:len(keep)] = arr[keep]
+        self.n = len(keep)
+        self.dead = 0
+
+    def cells(self, mtype=None):
+        n = self.n
+        live = self.alive[:n]
+        if mtype is not None:
+            live = live & (self.type[:n] == self.TYPES.index(mtype))
+        xs = (self.x[:n][live] + 0.5).astype(np.int64)
+        ys = (self.y[:n][live] + 0.5).astype(np.int64)
+        return xs, ys
+
+    def pack(self):
+        # live monsters only, one packed column per field
+        live = self.alive[:self.n]
+        cols = [getattr(self, name)[:self.n][live] for name in self.FIELDS[:-1]]
+        return struct.pack("<I", len(cols[0])) + b"".join(c.tobytes() for c in cols)
+
+    @classmethod
+    def unpack(cls, data, off):
+        (k,) = struct.unpack_from("<I", data, off)
+        off += 4
+        swarm = cls(max(k, 64))
+        for name in cls.FIELDS[:-1]:
+            arr = getattr(swarm, name)
+            col = np.frombuffer(data, dtype=arr.dtype, count=k, offset=off)
+            arr[:k] = col
+            off += col.nbytes
+        swarm.alive[:k] = True
+        swarm.n = k
+        return swarm, off
+
+    def kill_at(self, x, y, limit=None):
+        # kill live monsters on tile (x, y), at most limit of them; returns the count
+        n = self.n
+        hit = np.flatnonzero(
+            self.alive[:n]
+            & ((self.x[:n] + 0.5).astype(np.int64) == x)
+            & ((self.y[:n] + 0.5).astype(np.int64) == y)
+        )[:limit]
+        self.alive[hit] = False
+        self.dead += len(hit)
+        return len(hit)
+
+    def sprites(self, sprites, x0, y0, x1, y1):
+        # (surface, world pos) for live monsters overlapping tiles [x0, x1) x [y0, y1);
+        # drawn at their tick position, swarms are not interpolated
+        n = self.n
+        x, y = self.x[:n], self.y[:n]
+        idx = np.flatnonzero(self.alive[:n] & (x > x0 - 1) & (x < x1) & (y > y0 - 1) & (y < y1))
+        looks = [sprites.monster[t] for t in self.TYPES]
+        half = TILE_SIZE // 2
+        return [
+            sprites.centered(looks[t], mx * TILE_SIZE + half, my * TILE_SIZE + half)
+            for mx, my, t in zip(x[idx].tolist(), y[idx].tolist(), self.type[idx].tolist())
+        ]
 
-        nxt = game.bfs_next(cur, game.player_tile(), self.type)
-        return nxt if nxt else random.choice(nbs)
+    def update(self, dt, game):
+        n = self.n
+        if not n:
+            return
+        x, y, tx, ty = self.x[:n], self.y[:n], self.tx[:n], self.ty[:n]
+        alive, mtype, timer = self.alive[:n], self.type[:n], self.timer[:n]
+
+        timer -= dt
+        mtype[(mtype == 0) & (timer <= 0)] = 1
+
+        dx = tx - x
+        dy = ty - y
+        dist = np.hypot(dx, dy)
+        arrived = alive & (dist < 0.02)
+        moving = alive & ~arrived
+        step = np.minimum(dist, self.speed[:n] * dt)
+        scale = np.divide(step, dist, out=np.zeros(n), where=moving)
+        x += dx * scale
+        y += dy * scale
+        x[arrived] = tx[arrived]
+        y[arrived] = ty[arrived]
+        if arrived.any():
+            self._retarget(np.flatnonzero(arrived), game)
+
+        cx = (x + 0.5).astype(np.int64)
+        cy = (y + 0.5).astype(np.int64)
+        w = game.grid_w
+        tunnel = np.frombuffer(game.tilemap.cells, dtype=np.uint8)
+        digging = np.flatnonzero(alive & (mtype == 1) & (tunnel[cy * w + cx] == 0))
+        for i in digging:
+            if game.tilemap[cx[i], cy[i]] == 0:
+                game.dig(int(cx[i]), int(cy[i]))
+
+        px, py = game.player_tile()
+        touching = np.flatnonzero(alive & (cx == px) & (cy == py))
+        if len(touching):
+            if game.bonus_mode:
+                alive[touching] = False
+                self.dead += len(touching)
+                for _ in touching:
+                    game.monster_killed(by_bonus=True)
+            else:
+                game.kill_player()
 
-    def draw(self, surf):
-        px = GRID_X + self.x * TILE_SIZE + TILE_SIZE // 2
-        py = GRID_Y + self.y * TILE_SIZE + TILE_SIZE // 2
+        if self.dead * 2 > self.n:
+            self.compact()
+
+    def _solid_bags(self, game):
+        key = (game.nav_version, game.tilemap)
+        if self._bags is None or self._bags[:2] != key:
+            mask = np.zeros(game.grid_w * game.grid_h, dtype=bool)
+            for (bx, by), b in game.bag_grid.items():
+                if b.solid():
+                    mask[by * game.grid_w + bx] = True
+            self._bags = key + (mask,)
+        return self._bags[2]
+
+    def _retarget(self, idx, game):
+        # vectorized Monster.choose_target for the monsters in idx, which sit
+        # exactly on their target tile; neighbours are scored in NEIGHBORS order
+        w, h = game.grid_w, game.grid_h
+        tunnel = np.frombuffer(game.tilemap.cells, dtype=np.uint8)
+        solid = self._solid_bags(game)
+        player = game.player_tile()
+        for t, name in enumerate(self.TYPES):
+            sel = idx[self.type[idx] == t]
+            if not len(sel):
+                continue
+            cx, cy = self.tx[sel], self.ty[sel]
+            nx = cx[:, None] + self.DX
+            ny = cy[:, None] + self.DY
+            inside = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+            flat = np.where(inside, ny * w + nx, 0)
+            ok = inside & ~solid[flat]
+            if name == "nobbin":
+                ok &= tunnel[flat] == 1
+
+            field = np.frombuffer(game.flow_field(name), dtype=np.intc)
+            partial = game.flow_fields[name][2]
+            here = cy * w + cx
+            if partial and (field[here] < 0).any():
+                lost = int(np.flatnonzero(field[here] < 0)[0])
+                field = np.frombuffer(game.flow_field(name, (int(cx[lost]), int(cy[lost]))), dtype=np.intc)
+            d = field[flat]
 
-        if self.type == "nobbin":
-            main, shade, glow = (228, 72, 72), (140, 35, 35), (255, 145, 145)
-        else:
-            main, shade, glow = (150, 80, 226), (85, 45, 130), (210, 170, 255)
+            if game.bonus_mode:
+                score = np.where(ok, np.where(d >= 0, d, w * h), -1)
+                pick = score.argmax(axis=1)
+                routed = ok.any(axis=1)
+            else:
+                score = np.where(ok & (d >= 0), d, np.iinfo(np.intc).max)
+                pick = score.argmin(axis=1)
+                routed = (ok & (d >= 0)).any(axis=1)
+                at_player = (cx == player[0]) & (cy == player[1])
+                routed &= ~at_player
+            rows = np.arange(len(sel))
+            self.tx[sel] = np.where(routed, nx[rows, pick], cx)
+            self.ty[sel] = np.where(routed, ny[rows, pick], cy)
+
+            # no route: a random open neighbour, drawn from the game rng like Monster does
+            if not game.bonus_mode:
+                for r in np.flatnonzero(~routed & ~at_player & ok.any(axis=1)):
+                    k = game.rng.choice(np.flatnonzero(ok[r]).tolist())
+                    self.tx[sel[r]], self.ty[sel[r]] = nx[r, k], ny[r, k]
+
+
+class EventBus:
+    # side effects of the rules (sounds, stats) as named events: queued while
+    # ticks run, then coalesced and handed to every subscriber once per frame
+    # as {kind: count} in first-emitted order. Without subscribers emit() is
+    # a no-op, so headless runs pay nothing.
+    def __init__(self):
+        self.handlers = []
+        self.queue = []
 
-        body = [(px - 10, py + 8), (px - 10, py - 2), (px - 6, py - 8), (px + 6, py - 8), (px + 10, py - 2), (px + 10, py + 8)]
-        pygame.draw.polygon(surf, (20, 16, 24), body)
-        pygame.draw.polygon(surf, main, body)
-        pygame.draw.polygon(surf, shade, body, 2)
+    def subscribe(self, handler):
+        self.handlers.append(handler)
 
-        for wave in (-7, -2, 3, 8):
-            pygame.draw.circle(surf, main, (int(px + wave), int(py + 9)), 3)
-            pygame.draw.circle(surf, shade, (int(px + wave), int(py + 9)), 1)
+    def emit(self, kind: str):
+        if self.handlers:
+            self.queue.append(kind)
 
-        pygame.draw.circle(surf, (245, 245, 255), (int(px - 4), int(py - 2)), 3)
-        pygame.draw.circle(surf, (245, 245, 255), (int(px + 4), int(py - 2)), 3)
-        pygame.draw.circle(surf, glow, (int(px - 2), int(py - 2)), 1)
-        pygame.draw.circle(surf, glow, (int(px + 2), int(py - 2)), 1)
-        pygame.draw.circle(surf, (15, 15, 20), (int(px - 4), int(py - 1)), 1)
-        pygame.draw.circle(surf, (15, 15, 20), (int(px + 4), int(py - 1)), 1)
+    def dispatch(self):
+        if not self.queue:
+            return
+        counts = {}
+        for kind in self.queue:
+            counts[kind] = counts.get(kind, 0) + 1
+        self.queue = []
+        for handler in self.handlers:
+            handler(counts)
 
 
-class Game:
-    def __init__(self, screen):
-        self.screen = screen
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont("consolas", 22)
-        self.small = pygame.font.SysFont("consolas", 16)
-        self.audio = AudioManager()
+class NullAudio:
+    # stands in for AudioManager when the rules run without a mixer
+    def play_sfx(self, name: str):
+        pass
+
+    def play_music(self, name: str):
+        pass
+
+    def stop_music(self):
+        pass
+
+    def on_events(self, events):
+        pass
+
+
+class NullProfiler:
+    enabled = False
+
+    def begin(self):
+        pass
+
+    def lap(self, phase: str):
+        pass
+
+
+class FrameProfiler:
+    # wall time per frame phase via lap(), which books the time since the
+    # previous lap under the given phase; hot-path counters live on the
+    # Simulation and are sampled once per frame
+    PHASES = [
+        "events",
+        "update.player",
+        "update.bags",
+        "update.monsters",
+        "update.shots",
+        "update.rest",
+        "draw_world",
+        "draw_hud",
+        "draw_overlay",
+        "flip",
+    ]
+    COUNTERS = ["bfs_nodes", "flow_builds", "bag_at_calls", "entity_allocs"]
+
+    def __init__(self, trace_path=None):
+        self.trace_path = trace_path
+        self.enabled = trace_path is not None
+        self.visible = False
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.avg = dict.fromkeys(self.PHASES + self.COUNTERS + ["frame"], 0.0)
+        self.last_counts = dict.fromkeys(self.COUNTERS, 0)
+        self.rows = []
+        self._t = 0.0
+        self._frame_start = 0.0
+        self._fresh = True  # next sample replaces the running averages
+
+    def toggle(self, sim):
+        was_enabled = self.enabled
+        self.visible = not self.visible
+        self.enabled = self.visible or self.trace_path is not None
+        if self.enabled and not was_enabled:
+            # switched on mid-frame: start timing and counting from here, not
+            # from whenever the profiler was last running
+            self._t = self._frame_start = time.perf_counter()
+            self.last_counts = {name: getattr(sim, name) for name in self.COUNTERS}
+            for k in self.times:
+                self.times[k] = 0.0
+            self._fresh = True
+
+    def begin(self):
+        if self.enabled:
+            self._t = self._frame_start = time.perf_counter()
+
+    def lap(self, phase: str):
+        if self.enabled:
+            now = time.perf_counter()
+            self.times[phase] = self.times.get(phase, 0.0) + now - self._t
+            self._t = now
+
+    def end_frame(self, sim):
+        if not self.enabled:
+            return
+        row = {k: round(v * 1000, 4) for k, v in self.times.items()}
+        row["frame"] = round((self._t - self._frame_start) * 1000, 4)
+        for name in self.COUNTERS:
+            total = getattr(sim, name)
+            row[name] = total - self.last_counts[name]
+            self.last_counts[name] = total
+        for k, v in row.items():
+            self.avg[k] = v if self._fresh else self.avg[k] + (v - self.avg.get(k, 0.0)) * 0.1
+        self._fresh = False
+        if self.trace_path:
+            row["tick"] = sim.ticks
+            self.rows.append(row)
+        for k in self.times:
+            self.times[k] = 0.0
+
+    def overlay_lines(self):
+        lines = [f"frame {self.avg['frame']:5.2f} ms"]
+        lines += [f"{k:<15} {self.avg[k]:5.2f} ms" for k in self.PHASES]
+        lines += [f"{k:<15} {self.avg[k]:7.0f}" for k in self.COUNTERS]
+        return lines
+
+    def dump(self):
+        if not self.trace_path or not self.rows:
+            return
+        path = Path(self.trace_path)
+        with path.open("w", newline="", encoding="utf-8") as f:
+            if path.suffix == ".csv":
+                fields = ["tick", "frame"] + self.PHASES + self.COUNTERS
+                writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows(self.rows)
+            else:
+                json.dump(self.rows, f)
+        print(f"profile: {len(self.rows)} frames written to {path}")
+
+
+class InputLog:
+    # compact replay log: a header with the seed, map size, swarm size and the
+    # expected outcome, then one (varint tick delta, code byte) pair per input event
+    MAGIC = b"RDRP"
+    VERSION = 7  # bump whenever the snapshot layout, and so the recorded hash, changes
+    HEADER = struct.Struct("<4sBQHHIIiI16s")
+    DIRS = [None] + list(DIR_KEYS.values())
+    SHOOT, START, PAUSE, RESUME, RESTART = range(len(DIRS), len(DIRS) + 5)
+
+    def __init__(self, seed=0, width=GRID_W, height=GRID_H, swarm=0):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.swarm = swarm
+        self.events = bytearray()
+        self.count = 0
+        self.last_tick = 0
+        self.final_ticks = 0
+        self.final_score = 0
+        self.final_hash = bytes(16)
+
+    def log(self, tick, code):
+        delta = tick - self.last_tick
+        self.last_tick = tick
+        while delta >= 0x80:
+            self.events.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        self.events.append(delta)
+        self.events.append(code)
+        self.count += 1
+
+    def __iter__(self):
+        tick, i, data = 0, 0, self.events
+        while i < len(data):
+            delta = shift = 0
+            while True:
+                b = data[i]
+                i += 1
+                delta |= (b & 0x7F) << shift
+                shift += 7
+                if b < 0x80:
+                    break
+            tick += delta
+            yield tick, data[i]
+            i += 1
+
+    def finish(self, sim):
+        self.final_ticks = sim.ticks
+        self.final_score = sim.score
+        self.final_hash = sim.state_hash()
+
+    def save(self, path):
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, self.seed, self.width, self.height, self.swarm, self.final_ticks, self.final_score, self.count, self.final_hash
+        )
+        Path(path).write_bytes(header + self.events)
+
+    @classmethod
+    def load(cls, path):
+        data = Path(path).read_bytes()
+        magic, version, seed, width, height, swarm, ticks, score, count, digest = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f"{path}: not a replay log (or unsupported version)")
+        log = cls(seed, width, height, swarm)
+        log.events = bytearray(data[cls.HEADER.size:])
+        log.count = count
+        log.final_ticks, log.final_score, log.final_hash = ticks, score, digest
+        return log
+
+    def apply(self, sim, code):
+        if code < len(self.DIRS):
+            sim.set_direction(self.DIRS[code])
+        elif code == self.SHOOT:
+            sim.shoot()
+        elif code == self.START:
+            sim.start()
+        elif code == self.PAUSE:
+            sim.pause()
+        elif code == self.RESUME:
+            sim.resume()
+        elif code == self.RESTART:
+            sim.restart()
+
+
+def replay(path):
+    # re-simulate a recorded session headless at full speed and verify it
+    log = InputLog.load(path)
+    sim = Simulation(log.seed, width=log.width, height=log.height, swarm=log.swarm)
+    events = iter(log)
+    pending = next(events, None)
+    started = time.perf_counter()
+    while sim.ticks < log.final_ticks or pending:
+        while pending and pending[0] == sim.ticks:
+            log.apply(sim, pending[1])
+            pending = next(events, None)
+        if sim.ticks >= log.final_ticks:
+            break
+        sim.step()
+    elapsed = time.perf_counter() - started
+
+    ok = sim.score == log.final_score and sim.state_hash() == log.final_hash
+    speed = sim.ticks / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"replay: {sim.ticks} ticks, {log.count} inputs, score {sim.score} "
+        f"(recorded {log.final_score}), {speed:.0f} ticks/s ({speed * sim.TICK:.0f}x real time)"
+    )
+    print("replay: OK, state hash matches" if ok else "replay: MISMATCH")
+    return ok
+
+
+class Simulation:
+    # game rules only: no display, no mixer, no keyboard. Steps at a fixed
+    # tick with its own RNG, so a seed fully determines a run.
+    TICK = 1.0 / FPS
+
+    def __init__(self, seed=None, audio=None, level=1, width=GRID_W, height=GRID_H, levels=None, swarm=0):
+        if not (10 <= width <= MAX_GRID and 8 <= height <= MAX_GRID):
+            raise ValueError(f"map size {width}x{height} out of range (10x8 .. {MAX_GRID}x{MAX_GRID})")
+        if swarm and np is None:
+            raise RuntimeError("swarm levels need numpy")
+        if seed is None:
+            seed = random.randrange(2**32)
+        elif not 0 <= seed < 2**64:
+            raise ValueError(f"seed {seed} out of range (0 .. 2**64 - 1); replay logs store it in 64 bits")
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.grid_w = width
+        self.grid_h = height
+        self.swarm_size = swarm
+        self.recorder = None
+        self.audio = audio or NullAudio()
+        self.events = EventBus()
+        if audio is not None:
+            self.events.subscribe(audio.on_events)
+        self.levels = levels or LevelCache(background=False)
 
         self.state = "MENU"
         self.score = 0
         self.lives = 3
-        self.level = 1
+        self.level = level
         self.next_extra = 20000
+        self.ticks = 0
+        self.kills = 0
+        self.deaths = 0
+        self.prof = NullProfiler()
+        self.bag_watch = None  # set of woken bags, kept only while a Broadcaster is attached
+        # hot-path counters, sampled by FrameProfiler
+        self.bfs_nodes = 0
+        self.flow_builds = 0
+        self.bag_at_calls = 0
 
         self.last_turn_input = (1, 0)
-        self.pause_option = 0
         self.level_clear_timer = 0.0
 
+        # entities are recycled through free lists and the active lists are
+        # compacted in place, so steady-state ticks allocate nothing
+        self.bag_pool = EntityPool(Bag)
+        self.monster_pool = EntityPool(Monster)
+        self.shot_pool = EntityPool(Shot)
+        self.bags = []
+        self.monsters = []
+        self.shots = []
+        self._reset_bag_queue()
+
         self.new_level()
-        self.audio.play_music("music_title")
 
     def new_level(self):
-        self.tilemap = [[0 for _ in range(GRID_W)] for _ in range(GRID_H)]
-        for y in range(1, GRID_H - 1):
-            self.tilemap[y][1] = 1
-        for x in range(1, GRID_W - 1):
-            self.tilemap[GRID_H - 2][x] = 1
+        w, h = self.grid_w, self.grid_h
+        layout = self.levels.get(level_seed(self.seed, self.level), w, h)
+        self.tilemap = TileGrid(w, h)
+        self.tilemap.cells[:] = layout.tiles
 
         self.player_x = 1.0
         self.player_y = 1.0
@@ -411,12 +1284,17 @@ class Game:
         self.shot_delay = max(0.18, 0.33 + (self.level - 1) * 0.04)
 
         self.emeralds = set()
-        self.bags = []
-        self.shots = []
-        self.monsters = []
-
-        self.spawn_tile = (GRID_W - 2, 1)
-        self.total_monsters = min(12, 4 + self.level)
+        self._release_entities()
+        self._reset_bag_queue()
+        self.nav_version = 0
+        self.flow_fields = {}
+        self.swarm = MonsterSwarm() if self.swarm_size else None
+        # tile -> entity occupancy, kept in sync by add/move/remove helpers
+        self.bag_grid = {}
+        self.monster_grid = {}
+
+        self.spawn_tile = layout.spawn
+        self.total_monsters = self.swarm_size or min(12, 4 + self.level)
         self.spawned = 0
         self.spawn_timer = 0.9
 
@@ -429,35 +1307,105 @@ class Game:
 
         self.emerald_streak = 0
 
-        self._populate_level()
+        self._populate_level(layout)
+        # build the next level on the cache's worker while this one is played
+        self.levels.prefetch(level_seed(self.seed, self.level + 1), w, h)
 
-    def _populate_level(self):
-        safe = {(1, 1), (1, 2), (2, 1), self.spawn_tile}
-        for y in range(2, GRID_H - 2):
-            for x in range(2, GRID_W - 2):
-                r = random.random()
-                if r < 0.12 and (x, y) not in safe:
-                    self.emeralds.add((x, y))
-                elif r < 0.17 and (x, y) not in safe:
-                    self.bags.append(Bag(x, y))
-
-        while len(self.emeralds) < 22:
-            x = random.randint(2, GRID_W - 3)
-            y = random.randint(2, GRID_H - 3)
-            if (x, y) not in safe:
-                self.emeralds.add((x, y))
+    def _populate_level(self, layout):
+        self.emeralds = set(layout.emeralds)
+        for x, y in layout.bags:
+            self.add_bag(self.bag_pool.acquire(x, y))
 
     def in_bounds(self, x, y):
-        return 0 <= x < GRID_W and 0 <= y < GRID_H
+        return 0 <= x < self.grid_w and 0 <= y < self.grid_h
 
     def player_tile(self):
         return int(self.player_x + 0.5), int(self.player_y + 0.5)
 
     def bag_at(self, x, y):
-        for b in self.bags:
-            if b.tile() == (x, y):
-                return b
-        return None
+        self.bag_at_calls += 1
+        return self.bag_grid.get((x, y))
+
+    def add_bag(self, b):
+        b.seq = self.bag_seq
+        self.bag_seq += 1
+        self.bags.append(b)
+        self.bag_grid[b.tx, b.ty] = b
+        self.wake_bag(b)
+
+    def move_bag(self, b, x, y):
+        if self.bag_grid.get((b.tx, b.ty)) is b:
+            del self.bag_grid[b.tx, b.ty]
+            self.wake_above(b.tx, b.ty)
+        b.tx, b.ty = x, y
+        self.bag_grid[x, y] = b
+        self.wake_bag(b)
+
+    def remove_bag(self, b):
+        if self.bag_grid.get((b.tx, b.ty)) is b:
+            del self.bag_grid[b.tx, b.ty]
+            self.wake_above(b.tx, b.ty)
+        self.bags.remove(b)
+        if self.bag_watch is not None:
+            self.bag_watch.add(b)
+        b.queued = False
+        self.bag_pool.release(b)
+
+    # bag physics is event-driven: a bag at rest sleeps until its support may
+    # have changed, and only queued bags are stepped. The queue is ordered by
+    # bag list position, and a bag woken mid-pass behind the cursor still
+    # runs this tick, so the order matches stepping every bag every tick.
+
+    def wake_bag(self, b):
+        if b.queued:
+            return
+        b.queued = True
+        if self.bag_watch is not None:
+            self.bag_watch.add(b)
+        if b.seq > self.bag_cursor:
+            heapq.heappush(self.bag_queue, (b.seq, b))
+        else:
+            self.bag_later.append(b)
+
+    def wake_above(self, x, y):
+        b = self.bag_grid.get((x, y - 1))
+        if b is not None:
+            self.wake_bag(b)
+
+    def _reset_bag_queue(self):
+        self.bag_seq = 0
+        self.bag_queue = []
+        self.bag_later = []
+        self.bag_cursor = -1
+
+    def _release_entities(self):
+        for pool, items in ((self.bag_pool, self.bags), (self.monster_pool, self.monsters), (self.shot_pool, self.shots)):
+            for e in items:
+                pool.release(e)
+            items.clear()
+
+    @property
+    def entity_allocs(self):
+        return self.bag_pool.allocated + self.monster_pool.allocated + self.shot_pool.allocated
+
+    def monsters_at(self, x, y):
+        return self.monster_grid.get((x, y), ())
+
+    def add_monster(self, m):
+        self.monsters.append(m)
+        self.monster_grid.setdefault(m.cell, []).append(m)
+
+    def move_monster(self, m, x, y):
+        self._unlist_monster(m)
+        m.cell = (x, y)
+        self.monster_grid.setdefault(m.cell, []).append(m)
+
+    def _unlist_monster(self, m):
+        cell = self.monster_grid.get(m.cell)
+        if cell:
+            cell.remove(m)
+            if not cell:
+                del self.monster_grid[m.cell]
 
     def has_support(self, x, y):
         if not self.in_bounds(x, y):
@@ -465,52 +1413,113 @@ class Game:
         b = self.bag_at(x, y)
         if b and b.state != Bag.FALL:
             return True
-        return self.tilemap[y][x] == 0
+        return self.tilemap[x, y] == 0
+
+    def passable(self, x, y, mtype):
+        b = self.bag_at(x, y)
+        if b and b.solid():
+            return False
+        return mtype != "nobbin" or self.tilemap[x, y] == 1
 
     def valid_neighbors(self, x, y, mtype):
         out = []
-        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+        for dx, dy in NEIGHBORS:
             nx, ny = x + dx, y + dy
-            if not self.in_bounds(nx, ny):
-                continue
-            b = self.bag_at(nx, ny)
-            if b and b.solid():
-                continue
-            if mtype == "nobbin":
-                if self.tilemap[ny][nx] == 1:
-                    out.append((nx, ny))
-            else:
+            if self.in_bounds(nx, ny) and self.passable(nx, ny, mtype):
                 out.append((nx, ny))
         return out
 
-    def bfs_next(self, start, goal, mtype):
-        q = deque([start])
-        prev = {start: None}
+    def flow_field(self, mtype, tile=None):
+        # one BFS per monster type rooted at the player, shared by all monsters.
+        # The BFS stops once every monster of that type is reached, so a field
+        # may not cover `tile` yet; rebuild then rather than guess.
+        key = (self.player_tile(), self.nav_version)
+        cached = self.flow_fields.get(mtype)
+        if cached and cached[0] == key:
+            field, partial = cached[1], cached[2]
+            if not partial or tile is None or field[tile[1] * self.grid_w + tile[0]] != -1:
+                return field
+        targets = {m.cell for m in self.monsters if m.type == mtype and m.alive}
+        if self.swarm is not None:
+            targets.update(zip(*(c.tolist() for c in self.swarm.cells(mtype))))
+        if tile is not None:
+            targets.add(tile)
+        field, partial = self._build_flow_field(key[0], mtype, targets)
+        self.flow_fields[mtype] = (key, field, partial)
+        return field
+
+    def _build_flow_field(self, goal, mtype, targets=None):
+        # dist[i] = steps from tile i to goal, -1 if unreachable; tiles a
+        # monster can't enter still get a distance so it can step out of them.
+        # With targets, the search ends one ring past the farthest target so
+        # every neighbour of a target is labelled; returns (dist, partial).
+        w = self.grid_w
+        dist = array("i", [-1]) * (w * self.grid_h)
+        gx, gy = goal
+        if not self.in_bounds(gx, gy) or not self.passable(gx, gy, mtype):
+            return dist, False
+        dist[gy * w + gx] = 0
+        remaining = None
+        if targets is not None:
+            remaining = {ty * w + tx for tx, ty in targets if self.in_bounds(tx, ty)}
+            remaining.discard(gy * w + gx)
+        limit = 0 if remaining is not None and not remaining else None
+        q = deque([goal])
+        self.flow_builds += 1
         while q:
-            n = q.popleft()
-            if n == goal:
-                break
-            for nb in self.valid_neighbors(*n, mtype):
-                if nb not in prev:
-                    prev[nb] = n
-                    q.append(nb)
-        if goal not in prev:
-            return None
-        cur = goal
-        while prev[cur] and prev[cur] != start:
-            cur = prev[cur]
-        return cur
-
-    def manhattan(self, a, b):
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+            x, y = q.popleft()
+            d = dist[y * w + x]
+            if limit is not None and d > limit:
+                return dist, True
+            self.bfs_nodes += 1
+            d += 1
+            for dx, dy in NEIGHBORS:
+                nx, ny = x + dx, y + dy
+                if not self.in_bounds(nx, ny):
+                    continue
+                i = ny * w + nx
+                if dist[i] != -1:
+                    continue
+                dist[i] = d
+                if self.passable(nx, ny, mtype):
+                    q.append((nx, ny))
+                if remaining and i in remaining:
+                    remaining.discard(i)
+                    if not remaining:
+                        limit = d
+        return dist, False
+
+    def path_distance(self, tile, mtype):
+        d = self.flow_field(mtype, tile)[tile[1] * self.grid_w + tile[0]]
+        return d if d >= 0 else self.grid_w * self.grid_h
+
+    def path_next(self, start, mtype):
+        if start == self.player_tile():
+            return start
+        field = self.flow_field(mtype, start)
+        w = self.grid_w
+        best, best_d = None, -1
+        for nb in self.valid_neighbors(*start, mtype):
+            d = field[nb[1] * w + nb[0]]
+            if d >= 0 and (best is None or d < best_d):
+                best, best_d = nb, d
+        return best
+
+    def dig(self, x, y):
+        self.tilemap[x, y] = 1
+        self.nav_version += 1
+        self.wake_above(x, y)
 
     def crush_at(self, x, y):
         if self.player_tile() == (x, y):
             self.kill_player()
-        for m in self.monsters:
-            if m.alive and m.tile() == (x, y):
+        for m in self.monsters_at(x, y):
+            if m.alive:
                 m.alive = False
                 self.monster_killed(by_bonus=False)
+        if self.swarm is not None:
+            for _ in range(self.swarm.kill_at(x, y)):
+                self.monster_killed(by_bonus=False)
 
     def monster_killed(self, by_bonus=False):
         if by_bonus:
@@ -519,16 +1528,18 @@ class Game:
             self.score += pts
         else:
             self.score += 250
-        self.audio.play_sfx("sfx_monster_die")
+        self.kills += 1
+        self.events.emit("monster_die")
 
     def kill_player(self):
         if self.state != "PLAYING":
             return
-        self.audio.play_sfx("sfx_player_die")
+        self.events.emit("player_die")
         self.lives -= 1
+        self.deaths += 1
         if self.lives <= 0:
             self.state = "GAME_OVER"
-            self.audio.stop_music()
+            self.events.emit("game_over")
             return
 
         self.player_x = 1.0
@@ -536,16 +1547,6 @@ class Game:
         self.player_target = (1, 1)
         self.player_dir = (1, 0)
 
-    def poll_keyboard_direction(self):
-        keys = pygame.key.get_pressed()
-        priority = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
-        for k in priority:
-            if keys[k]:
-                self.wanted_dir = DIR_KEYS[k]
-                self.last_turn_input = self.wanted_dir
-                return
-        self.wanted_dir = None
-
     def can_move_player(self, nx, ny, dx, dy):
         if not self.in_bounds(nx, ny):
             return False
@@ -563,10 +1564,11 @@ class Game:
             return False
         if self.bag_at(px, py):
             return False
-        if self.tilemap[py][px] == 0:
+        if self.tilemap[px, py] == 0:
             return False
 
-        b.tx, b.ty = px, py
+        self.move_bag(b, px, py)
+        self.nav_version += 1
         return True
 
     def collect(self):
@@ -575,7 +1577,7 @@ class Game:
             self.emeralds.remove(pt)
             self.score += 25
             self.emerald_streak += 1
-            self.audio.play_sfx("sfx_emerald")
+            self.events.emit("emerald")
             if self.emerald_streak >= 8:
                 self.score += 250
                 self.emerald_streak = 0
@@ -583,8 +1585,8 @@ class Game:
         b = self.bag_at(*pt)
         if b and b.state == Bag.GOLD:
             self.score += 500
-            self.audio.play_sfx("sfx_gold_collect")
-            self.bags.remove(b)
+            self.events.emit("gold_collect")
+            self.remove_bag(b)
 
         if self.cherry_active and pt == self.cherry_pos:
             self.cherry_active = False
@@ -592,7 +1594,7 @@ class Game:
             self.bonus_mode = True
             self.bonus_chain = 0
             self.bonus_timer = max(7.0, 14.0 - self.level * 0.55)
-            self.audio.play_sfx("sfx_bonus_start")
+            self.events.emit("bonus_start")
 
         if self.score >= self.next_extra:
             self.next_extra += 20000
@@ -633,21 +1635,28 @@ class Game:
             self.player_y += dy / dist * step
 
         tx, ty = self.player_tile()
-        if self.in_bounds(tx, ty) and self.tilemap[ty][tx] == 0:
-            self.tilemap[ty][tx] = 1
-            self.audio.play_sfx("sfx_dig")
+        if self.tilemap.get(tx, ty, 1) == 0:
+            self.dig(tx, ty)
+            self.events.emit("dig")
 
     def spawn_monsters(self, dt):
         if self.spawned >= self.total_monsters:
             if not self.cherry_active and self.cherry_pos is None:
-                self.cherry_pos = (GRID_W // 2, GRID_H // 2)
+                self.cherry_pos = (self.grid_w // 2, self.grid_h // 2)
                 self.cherry_active = True
             return
 
         self.spawn_timer -= dt
         if self.spawn_timer <= 0:
             speed = min(5.8, 2.2 + self.level * 0.32)
-            self.monsters.append(Monster(*self.spawn_tile, "nobbin", speed))
+            if self.swarm is not None:
+                # swarm levels release their monsters in waves
+                k = min(max(1, self.total_monsters // 20), self.total_monsters - self.spawned)
+                self.swarm.add(*self.spawn_tile, speed, [self.rng.uniform(8.0, 14.0) for _ in range(k)])
+                self.spawned += k
+                self.spawn_timer = 0.5
+                return
+            self.add_monster(self.monster_pool.acquire(*self.spawn_tile, "nobbin", speed, self.rng))
             self.spawned += 1
             self.spawn_timer = max(0.85, 2.4 - self.level * 0.16)
 
@@ -655,58 +1664,362 @@ class Game:
         if self.state != "PLAYING" or self.shot_cd > 0:
             return
         tx, ty = self.player_tile()
-        self.shots.append(Shot(tx, ty, self.player_dir))
+        self.shots.append(self.shot_pool.acquire(tx, ty, self.player_dir))
         self.shot_cd = self.shot_delay
-        self.audio.play_sfx("sfx_shoot")
+        self.events.emit("shoot")
+        self._record(InputLog.SHOOT)
+
+    # input injection: everything a frontend may feed into the rules
+
+    def _record(self, code):
+        if self.recorder is not None:
+            self.recorder.log(self.ticks, code)
+
+    def set_direction(self, direction):
+        if direction != self.wanted_dir:
+            self._record(InputLog.DIRS.index(direction))
+        self.wanted_dir = direction
+        if direction:
+            self.last_turn_input = direction
+
+    def start(self):
+        if self.state == "MENU":
+            self._record(InputLog.START)
+            self.state = "PLAYING"
+
+    def pause(self):
+        if self.state == "PLAYING":
+            self._record(InputLog.PAUSE)
+            self.state = "PAUSED"
+
+    def resume(self):
+        if self.state == "PAUSED":
+            self._record(InputLog.RESUME)
+            self.state = "PLAYING"
+
+    def restart(self):
+        self._record(InputLog.RESTART)
+        self.score = 0
+        self.lives = 3
+        self.level = 1
+        self.next_extra = 20000
+        self.state = "PLAYING"
+        self.new_level()
+
+    def step(self):
+        self.update(self.TICK)
+        self.ticks += 1
+
+    # save states: one flat binary blob, cheap enough to take every tick
+
+    STATES = ["MENU", "PLAYING", "PAUSED", "GAME_OVER"]
+    BAG_STATES = [Bag.REST, Bag.WOBBLE, Bag.FALL, Bag.GOLD]
+    MONSTER_TYPES = ["nobbin", "hobbin"]
+    SNAP_MAGIC = b"RDSS"
+    SNAP_VERSION = 4  # 4: carries the swarm size; 3: the seed; 2: counts are 32-bit
+    SNAP_HEAD = struct.Struct("<4sBQIHHBiiiiIIIbbBbbddhhdddIId?hh?dBHIIII")
+    SNAP_BAG = struct.Struct("<HHBddH")
+    SNAP_MONSTER = struct.Struct("<ddhhBd?d")
+    SNAP_SHOT = struct.Struct("<ddbb?")
+    SNAP_RNG = struct.Struct("<625I?d")
+    BITS = bytes.maketrans(b"\x00\x01", b"01")
+    UNBITS = bytes.maketrans(b"01", b"\x00\x01")
+
+    def snapshot(self):
+        cells = self.tilemap.cells
+        n = len(cells)
+        tiles = int(cells.translate(self.BITS), 2).to_bytes((n + 7) // 8, "big")
+        emeralds = sorted(self.emeralds)
+        _, mt_state, gauss = self.rng.getstate()
+        cherry = self.cherry_pos or (-1, -1)
+
+        parts = [
+            self.SNAP_HEAD.pack(
+                self.SNAP_MAGIC, self.SNAP_VERSION, self.seed, self.swarm_size, self.tilemap.w, self.tilemap.h, self.STATES.index(self.state),
+                self.score, self.lives, self.level, self.next_extra, self.ticks, self.kills, self.deaths,
+                *self.last_turn_input, InputLog.DIRS.index(self.wanted_dir), *self.player_dir,
+                self.player_x, self.player_y, *self.player_target,
+                self.level_clear_timer, self.shot_cd, self.shot_delay,
+                self.total_monsters, self.spawned, self.spawn_timer,
+                self.cherry_active, *cherry, self.bonus_mode, self.bonus_timer, self.bonus_chain,
+                self.emerald_streak, len(emeralds), len(self.bags), len(self.monsters), len(self.shots),
+            ),
+            self.SNAP_RNG.pack(*mt_state, gauss is not None, gauss or 0.0),
+            tiles,
+            struct.pack(f"<{2 * len(emeralds)}H", *(c for e in emeralds for c in e)),
+        ]
+        bag_states = self.BAG_STATES
+        for b in self.bags:
+            parts.append(self.SNAP_BAG.pack(b.tx, b.ty, bag_states.index(b.state), b.timer, b.offset_y, b.fall_tiles))
+        types = self.MONSTER_TYPES
+        for m in self.monsters:
+            parts.append(self.SNAP_MONSTER.pack(
+                m.x, m.y, *m.target, types.index(m.type), m.speed, m.alive, m.transform_timer
+            ))
+        for sh in self.shots:
+            parts.append(self.SNAP_SHOT.pack(sh.x, sh.y, *sh.direction, sh.active))
+        if self.swarm is not None:  # trailing section, only in swarm levels
+            parts.append(self.swarm.pack())
+        return b"".join(parts)
+
+    def restore(self, data):
+        head = self.SNAP_HEAD.unpack_from(data)
+        if head[0] != self.SNAP_MAGIC or head[1] != self.SNAP_VERSION:
+            raise ValueError("not a save state (or unsupported version)")
+        (
+            _, _, self.seed, self.swarm_size, w, h, state, self.score, self.lives, self.level, self.next_extra,
+            self.ticks, self.kills, self.deaths, ltx, lty, wanted, pdx, pdy,
+            self.player_x, self.player_y, ptx, pty, self.level_clear_timer, self.shot_cd, self.shot_delay,
+            self.total_monsters, self.spawned, self.spawn_timer, self.cherry_active, chx, chy,
+            self.bonus_mode, self.bonus_timer, self.bonus_chain, self.emerald_streak,
+            n_emeralds, n_bags, n_monsters, n_shots,
+        ) = head
+        self.state = self.STATES[state]
+        self.last_turn_input = (ltx, lty)
+        self.wanted_dir = InputLog.DIRS[wanted]
+        self.player_dir = (pdx, pdy)
+        self.player_target = (ptx, pty)
+        self.cherry_pos = (chx, chy) if chx >= 0 else None
+        off = self.SNAP_HEAD.size
+
+        rng = self.SNAP_RNG.unpack_from(data, off)
+        off += self.SNAP_RNG.size
+
+        n = w * h
+        nbytes = (n + 7) // 8
+        bits = format(int.from_bytes(data[off:off + nbytes], "big"), f"0{n}b")
+        self.grid_w, self.grid_h = w, h
+        self.spawn_tile = (w - 2, 1)  # where levelgen always puts it for this size
+        self.tilemap = TileGrid(w, h)
+        self.tilemap.cells[:] = bits.encode().translate(self.UNBITS)
+        off += nbytes
+
+        flat = struct.unpack_from(f"<{2 * n_emeralds}H", data, off)
+        self.emeralds = set(zip(flat[0::2], flat[1::2]))
+        off += 4 * n_emeralds
+
+        self._release_entities()
+        self._reset_bag_queue()
+        self.bag_grid = {}
+        for _ in range(n_bags):
+            tx, ty, st, timer, offset_y, fall_tiles = self.SNAP_BAG.unpack_from(data, off)
+            off += self.SNAP_BAG.size
+            b = self.bag_pool.acquire(tx, ty)
+            b.state, b.timer, b.offset_y, b.fall_tiles = self.BAG_STATES[st], timer, offset_y, fall_tiles
+            self.add_bag(b)
+
+        self.monster_grid = {}
+        for _ in range(n_monsters):
+            x, y, ttx, tty, mtype, speed, alive, timer = self.SNAP_MONSTER.unpack_from(data, off)
+            off += self.SNAP_MONSTER.size
+            m = self.monster_pool.acquire(0, 0, self.MONSTER_TYPES[mtype], speed, self.rng)
+            m.x, m.y, m.target, m.alive, m.transform_timer = x, y, (ttx, tty), alive, timer
+            m.cell = m.tile()
+            self.add_monster(m)
+
+        for _ in range(n_shots):
+            x, y, dx, dy, active = self.SNAP_SHOT.unpack_from(data, off)
+            off += self.SNAP_SHOT.size
+            sh = self.shot_pool.acquire(0, 0, (dx, dy))
+            sh.x, sh.y, sh.active = x, y, active
+            self.shots.append(sh)
+
+        self.swarm = None
+        if off < len(data):
+            self.swarm, off = MonsterSwarm.unpack(data, off)
+
+        # last, since building the Monsters above draws from the rng
+        self.rng.setstate((3, rng[:625], rng[626] if rng[625] else None))
+        self.nav_version += 1
+        self.flow_fields = {}
+
+    def state_hash(self):
+        return hashlib.blake2b(self.snapshot(), digest_size=16).digest()
 
     def update(self, dt):
         if self.state != "PLAYING":
             return
 
-        self.poll_keyboard_direction()
+        prof = self.prof
+        prof.lap("update.rest")
         self.shot_cd = max(0.0, self.shot_cd - dt)
+        # bags still wobbling or falling from last tick, plus ones woken since
+        self.bag_cursor = -1
+        for b in self.bag_later:
+            heapq.heappush(self.bag_queue, (b.seq, b))
+        self.bag_later.clear()
 
         self.update_player(dt)
         self.collect()
+        prof.lap("update.player")
 
-        for b in list(self.bags):
+        queue = self.bag_queue
+        while queue:
+            self.bag_cursor, b = heapq.heappop(queue)
+            if not b.queued:  # collected meanwhile
+                continue
+            b.queued = False
             b.update(dt, self)
+            if b.state in (Bag.WOBBLE, Bag.FALL):
+                self.wake_bag(b)
+        self.bag_cursor = float("inf")
+        prof.lap("update.bags")
 
         self.spawn_monsters(dt)
 
-        for m in self.monsters:
+        monsters = self.monsters
+        for m in monsters:
             m.update(dt, self)
-        self.monsters = [m for m in self.monsters if m.alive]
-
-        for s in self.shots:
+        j = 0
+        for m in monsters:
+            if m.alive:
+                monsters[j] = m
+                j += 1
+            else:
+                self._unlist_monster(m)
+                self.monster_pool.release(m)
+        del monsters[j:]
+        if self.swarm is not None:
+            self.swarm.update(dt, self)
+        prof.lap("update.monsters")
+
+        shots = self.shots
+        for s in shots:
             s.update(dt, self)
-        self.shots = [s for s in self.shots if s.active]
+        j = 0
+        for s in shots:
+            if s.active:
+                shots[j] = s
+                j += 1
+            else:
+                self.shot_pool.release(s)
+        del shots[j:]
+        prof.lap("update.shots")
 
         if self.bonus_mode:
             self.bonus_timer -= dt
             if self.bonus_timer <= 0:
                 self.bonus_mode = False
                 self.bonus_timer = 0.0
-                self.audio.play_sfx("sfx_bonus_end")
+                self.events.emit("bonus_end")
 
         if not self.emeralds:
             self.level_clear_timer += dt
             if self.level_clear_timer > 1.2:
-                self.audio.play_level_clear()
+                self.events.emit("level_clear")
                 self.level += 1
                 self.level_clear_timer = 0.0
                 self.new_level()
         else:
             self.level_clear_timer = 0.0
+        prof.lap("update.rest")
+
+
+class Game(Simulation):
+    def __init__(
+        self, screen, seed=None, started=None, profile=None, record=None, fps=FPS, uncapped=False,
+        width=GRID_W, height=GRID_H, swarm=0, broadcast=None,
+    ):
+        self.started = started
+        self.fps = 0 if uncapped else fps
+        # render between simulation ticks whenever frames and ticks don't line up 1:1
+        self.interpolate = uncapped or fps != FPS
+        self.alpha = 1.0
+        self.prev_pos = {}
+        self.frame_times = deque(maxlen=20000)
+        self.record_path = record
+        self.screen = screen
+        self.clock = pygame.time.Clock()
+        self.font = pygame.font.SysFont("consolas", 22)
+        self.small = pygame.font.SysFont("consolas", 16)
+        self.sprites = Sprites()
+        self.text = TextCache()
+        self.dimmer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        self.dimmer.fill((0, 0, 0, 155))
+        self.pause_option = 0
+
+        # the playfield shows a GRID_W x GRID_H window onto the map, scrolled
+        # in pixels; terrain lives in lazily built chunk surfaces
+        self.viewport = pygame.Rect(GRID_X, GRID_Y, GRID_W * TILE_SIZE, GRID_H * TILE_SIZE)
+        self.cam_x = self.cam_y = 0
+        self.chunks = OrderedDict()
+
+        # dirty-rect bookkeeping: what is on screen right now
+        self.full_redraw = True
+        self.drawn_view = None
+        self.drawn_sprites = set()
+        self.drawn_hud = None
+        self.drawn_camera = None
+        self.dirty = []
+
+        super().__init__(seed, AudioManager(), width=width, height=height, levels=LevelCache(), swarm=swarm)
+        self.prof = FrameProfiler(profile)
+        self.event_totals = {}
+        self.events.subscribe(self.tally_events)
+        if record:
+            self.recorder = InputLog(self.seed, width, height, swarm)
+        self.broadcaster = Broadcaster(broadcast) if broadcast else None
+        self.audio.play_music("music_title")
+
+    def new_level(self):
+        super().new_level()
+        self.follow_camera(snap=True)
+        self.build_terrain()
+        self.full_redraw = True
+
+    def dig(self, x, y):
+        super().dig(x, y)
+        self.draw_tile(x, y)
+        rect = pygame.Rect(self.to_screen(x * TILE_SIZE, y * TILE_SIZE), (TILE_SIZE, TILE_SIZE))
+        if rect.colliderect(self.viewport):
+            self.dirty.append(rect)
+
+    def restore(self, data):
+        super().restore(data)
+        self.follow_camera(snap=True)
+        self.build_terrain()
+        self.full_redraw = True
+
+    def step(self):
+        if self.interpolate:
+            prev = self.prev_pos
+            prev.clear()
+            prev[self] = (self.player_x, self.player_y)
+            for e in self.monsters:
+                prev[e] = (e.x, e.y)
+            for e in self.shots:
+                prev[e] = (e.x, e.y)
+        super().step()
+        if self.broadcaster is not None:
+            self.broadcaster.publish(self)
+
+    def lerp(self, e, x, y):
+        prev = self.prev_pos.get(e)
+        # no blending across respawns/teleports
+        if prev is None or abs(x - prev[0]) + abs(y - prev[1]) > 1.5:
+            return x, y
+        a = self.alpha
+        return prev[0] + (x - prev[0]) * a, prev[1] + (y - prev[1]) * a
+
+    def poll_keyboard_direction(self):
+        keys = pygame.key.get_pressed()
+        priority = [pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT]
+        for k in priority:
+            if keys[k]:
+                self.set_direction(DIR_KEYS[k])
+                return
+        self.set_direction(None)
 
     def handle_keydown(self, key):
         if key in DIR_KEYS:
-            self.wanted_dir = DIR_KEYS[key]
-            self.last_turn_input = self.wanted_dir
+            self.set_direction(DIR_KEYS[key])
 
         if key in (pygame.K_SPACE, pygame.K_LCTRL, pygame.K_RCTRL):
             self.shoot()
 
+        if key == pygame.K_F3:
+            self.prof.toggle(self)
+
         if key == pygame.K_m:
             self.audio.toggle_music()
         elif key == pygame.K_n:
@@ -721,11 +2034,11 @@ class Game:
             self.audio.adjust_sfx(0.1)
 
         if self.state == "MENU" and key == pygame.K_RETURN:
-            self.state = "PLAYING"
+            self.start()
             self.audio.play_music("music_game")
 
         elif self.state == "PLAYING" and key == pygame.K_ESCAPE:
-            self.state = "PAUSED"
+            self.pause()
             self.pause_option = 0
 
         elif self.state == "PAUSED":
@@ -733,162 +2046,403 @@ class Game:
                 self.pause_option = 1 - self.pause_option
             elif key == pygame.K_RETURN:
                 if self.pause_option == 0:
-                    self.state = "PLAYING"
+                    self.resume()
                 else:
                     pygame.event.post(pygame.event.Event(pygame.QUIT))
             elif key == pygame.K_ESCAPE:
-                self.state = "PLAYING"
+                self.resume()
 
         elif self.state == "GAME_OVER" and key == pygame.K_r:
-            self.score = 0
-            self.lives = 3
-            self.level = 1
-            self.next_extra = 20000
-            self.state = "PLAYING"
-            self.new_level()
+            self.restart()
             self.audio.play_music("music_game")
 
+    def to_screen(self, wx, wy):
+        return GRID_X + wx - self.cam_x, GRID_Y + wy - self.cam_y
+
+    def follow_camera(self, snap=False):
+        # dead-zone camera: scroll only once the player gets within a few
+        # tiles of the viewport edge; maps no larger than the view never scroll
+        x, y = self.player_x, self.player_y
+        if self.interpolate:
+            x, y = self.lerp(self, x, y)
+        view_w, view_h = self.viewport.size
+        px, py = int(x * TILE_SIZE) + TILE_SIZE // 2, int(y * TILE_SIZE) + TILE_SIZE // 2
+        if snap:
+            cx, cy = px - view_w // 2, py - view_h // 2
+        else:
+            mx, my = 6 * TILE_SIZE, 4 * TILE_SIZE
+            cx = min(max(self.cam_x, px + mx - view_w), px - mx)
+            cy = min(max(self.cam_y, py + my - view_h), py - my)
+        self.cam_x = min(max(cx, 0), max(0, self.grid_w * TILE_SIZE - view_w))
+        self.cam_y = min(max(cy, 0), max(0, self.grid_h * TILE_SIZE - view_h))
+
+    def visible_tiles(self, margin=0):
+        # tile range (x0, y0, x1, y1) under the viewport, grown by margin tiles
+        view_w, view_h = self.viewport.size
+        x0 = max(0, self.cam_x // TILE_SIZE - margin)
+        y0 = max(0, self.cam_y // TILE_SIZE - margin)
+        x1 = min(self.grid_w, (self.cam_x + view_w - 1) // TILE_SIZE + 1 + margin)
+        y1 = min(self.grid_h, (self.cam_y + view_h - 1) // TILE_SIZE + 1 + margin)
+        return x0, y0, x1, y1
+
+    def build_terrain(self):
+        # drop every cached chunk and pre-render the ones on screen; further
+        # chunks are built as the camera reaches them, dug tiles are patched in
+        self.chunks.clear()
+        x0, y0, x1, y1 = self.visible_tiles()
+        for cy in range(y0 // CHUNK, (y1 - 1) // CHUNK + 1):
+            for cx in range(x0 // CHUNK, (x1 - 1) // CHUNK + 1):
+                self.chunk(cx, cy)
+
+    def chunk(self, cx, cy):
+        surf = self.chunks.get((cx, cy))
+        if surf is not None:
+            self.chunks.move_to_end((cx, cy))
+            return surf
+        w = min(CHUNK, self.grid_w - cx * CHUNK)
+        h = min(CHUNK, self.grid_h - cy * CHUNK)
+        surf = self.chunks[cx, cy] = pygame.Surface((w * TILE_SIZE, h * TILE_SIZE), 0, self.screen)
+        for y in range(cy * CHUNK, cy * CHUNK + h):
+            for x in range(cx * CHUNK, cx * CHUNK + w):
+                self.draw_tile(x, y)
+        if len(self.chunks) > CHUNK_CACHE:
+            self.chunks.popitem(last=False)
+        return surf
+
     def draw_tile(self, x, y):
-        px = GRID_X + x * TILE_SIZE
-        py = GRID_Y + y * TILE_SIZE
+        surf = self.chunks.get((x // CHUNK, y // CHUNK))
+        if surf is None:  # off-screen chunk, rendered from the tilemap when needed
+            return
+        px = x % CHUNK * TILE_SIZE
+        py = y % CHUNK * TILE_SIZE
         rect = pygame.Rect(px, py, TILE_SIZE, TILE_SIZE)
 
-        if self.tilemap[y][x] == 0:  # earth
-            pygame.draw.rect(self.screen, (83, 48, 28), rect)
-            pygame.draw.rect(self.screen, (67, 36, 20), rect, 1)
+        if self.tilemap[x, y] == 0:  # earth
+            pygame.draw.rect(surf, (83, 48, 28), rect)
+            pygame.draw.rect(surf, (67, 36, 20), rect, 1)
             # retro dirt pattern
             for oy in (6, 15, 24):
                 for ox in (5, 13, 22):
                     c = (102, 65, 40) if (ox + oy) % 2 else (56, 30, 18)
-                    self.screen.fill(c, (px + ox, py + oy, 2, 2))
+                    surf.fill(c, (px + ox, py + oy, 2, 2))
         else:  # tunnel
-            pygame.draw.rect(self.screen, (34, 34, 38), rect)
-            pygame.draw.rect(self.screen, (20, 20, 24), rect, 1)
-            self.screen.fill((46, 46, 52), (px + 3, py + 3, TILE_SIZE - 6, 1))
-
-    def draw_world(self):
-        for y in range(GRID_H):
-            for x in range(GRID_W):
-                self.draw_tile(x, y)
-
-        for ex, ey in self.emeralds:
-            px = GRID_X + ex * TILE_SIZE + TILE_SIZE // 2
-            py = GRID_Y + ey * TILE_SIZE + TILE_SIZE // 2
-            pts = [(px, py - 9), (px + 8, py), (px, py + 9), (px - 8, py)]
-            pygame.draw.polygon(self.screen, (20, 235, 190), pts)
-            pygame.draw.polygon(self.screen, (10, 100, 80), pts, 1)
+            pygame.draw.rect(surf, (34, 34, 38), rect)
+            pygame.draw.rect(surf, (20, 20, 24), rect, 1)
+            surf.fill((46, 46, 52), (px + 3, py + 3, TILE_SIZE - 6, 1))
+
+    def blit_terrain(self, rect):
+        # copy the terrain under a screen rect out of the chunks it overlaps
+        rect = rect.clip(self.viewport)
+        if not rect:
+            return
+        span = CHUNK * TILE_SIZE
+        ox, oy = self.to_screen(0, 0)
+        wx0, wy0 = rect.x - ox, rect.y - oy
+        cx1 = min((wx0 + rect.w - 1) // span + 1, (self.grid_w - 1) // CHUNK + 1)
+        cy1 = min((wy0 + rect.h - 1) // span + 1, (self.grid_h - 1) // CHUNK + 1)
+        for cy in range(wy0 // span, cy1):
+            for cx in range(wx0 // span, cx1):
+                surf = self.chunk(cx, cy)
+                dx, dy = ox + cx * span, oy + cy * span
+                area = rect.move(-dx, -dy).clip(surf.get_rect())
+                self.screen.blit(surf, area.move(dx, dy), area)
+
+    def _in_view(self, cells, x0, y0, x1, y1):
+        # walk whichever is smaller: the occupied cells or the visible tiles
+        if len(cells) <= (x1 - x0) * (y1 - y0):
+            return [c for c in cells if x0 <= c[0] < x1 and y0 <= c[1] < y1]
+        return [(x, y) for y in range(y0, y1) for x in range(x0, x1) if (x, y) in cells]
+
+    def sprite_list(self):
+        # everything on screen drawn on top of the terrain, in back-to-front
+        # order; entities outside the viewport are culled here
+        sprites = self.sprites
+        emerald = sprites.emerald
+        ox, oy = self.to_screen(0, 0)
+        x0, y0, x1, y1 = self.visible_tiles()
+        out = [(emerald, (ox + ex * TILE_SIZE, oy + ey * TILE_SIZE)) for ex, ey in self._in_view(self.emeralds, x0, y0, x1, y1)]
 
         if self.cherry_active and self.cherry_pos:
-            cx = GRID_X + self.cherry_pos[0] * TILE_SIZE + TILE_SIZE // 2
-            cy = GRID_Y + self.cherry_pos[1] * TILE_SIZE + TILE_SIZE // 2
-            pygame.draw.circle(self.screen, (220, 50, 70), (cx - 4, cy), 7)
-            pygame.draw.circle(self.screen, (220, 50, 70), (cx + 4, cy), 7)
-            pygame.draw.circle(self.screen, (255, 120, 150), (cx - 6, cy - 2), 2)
-            pygame.draw.circle(self.screen, (255, 120, 150), (cx + 2, cy - 2), 2)
-            pygame.draw.line(self.screen, (30, 180, 80), (cx, cy - 8), (cx + 7, cy - 14), 2)
-
-        for b in self.bags:
-            b.draw(self.screen)
-        for m in self.monsters:
-            m.draw(self.screen)
-        for s in self.shots:
-            s.draw(self.screen)
-
-        self.draw_player()
+            cx = ox + self.cherry_pos[0] * TILE_SIZE
+            cy = oy + self.cherry_pos[1] * TILE_SIZE
+            out.append((sprites.cherry, (cx, cy)))
+
+        # a falling bag reaches one tile down from its cell
+        bags = self.bag_grid
+        world = [bags[c].sprite(sprites) for c in self._in_view(bags, x0, max(0, y0 - 1), x1, y1)]
+        if self.interpolate:
+            world.extend(m.sprite(sprites, *self.lerp(m, m.x, m.y)) for m in self.monsters)
+            world.extend(s.sprite(sprites, *self.lerp(s, s.x, s.y)) for s in self.shots)
+        else:
+            world.extend(m.sprite(sprites) for m in self.monsters)
+            world.extend(s.sprite(sprites) for s in self.shots)
+        if self.swarm is not None:
+            world.extend(self.swarm.sprites(sprites, x0, y0, x1, y1))
+        world.append(self.player_sprite())
+
+        view = self.viewport
+        for surf, (wx, wy) in world:
+            pos = (ox + wx, oy + wy)
+            if view.colliderect(pos, (TILE_SIZE, TILE_SIZE)):
+                out.append((surf, pos))
+        return out
 
-    def draw_player(self):
-        px = GRID_X + self.player_x * TILE_SIZE + TILE_SIZE // 2
-        py = GRID_Y + self.player_y * TILE_SIZE + TILE_SIZE // 2
+    def draw_world(self, items):
+        self.screen.set_clip(self.viewport)
+        self.blit_terrain(self.viewport)
+        self.screen.blits(items, False)
+        self.screen.set_clip(None)
+
+    def redraw_regions(self, rects, items):
+        # restore background under each rect, then repaint sprites touching any of them
+        self.screen.set_clip(self.viewport)
+        for r in rects:
+            self.screen.fill((10, 10, 14), r)
+            self.blit_terrain(r)
+        for surf, pos in items:
+            if pygame.Rect(pos, (TILE_SIZE, TILE_SIZE)).collidelist(rects) != -1:
+                self.screen.blit(surf, pos)
+        self.screen.set_clip(None)
+
+    def player_sprite(self):
+        x, y = self.player_x, self.player_y
+        if self.interpolate:
+            x, y = self.lerp(self, x, y)
+        px = x * TILE_SIZE + TILE_SIZE // 2
+        py = y * TILE_SIZE + TILE_SIZE // 2
 
         if self.bonus_mode:
-            blink_on = (pygame.time.get_ticks() // 120) % 2 == 0
-            body = (255, 255, 255) if blink_on else (255, 255, 155)
-            border = (220, 220, 220) if blink_on else (145, 115, 30)
+            phase = "blink_on" if (pygame.time.get_ticks() // 120) % 2 == 0 else "blink_off"
         else:
-            body = (255, 245, 120)
-            border = (145, 115, 30)
-        pygame.draw.circle(self.screen, border, (int(px), int(py)), 12)
-        pygame.draw.circle(self.screen, body, (int(px), int(py)), 10)
-
-        dx, dy = self.player_dir
-        nose_x = px + dx * 10
-        nose_y = py + dy * 10
-        pygame.draw.circle(self.screen, (255, 180, 50), (int(nose_x), int(nose_y)), 4)
-
-        eye_x = px + (3 if dx >= 0 else -3)
-        eye_y = py - 3
-        pygame.draw.circle(self.screen, (20, 20, 20), (int(eye_x), int(eye_y)), 2)
+            phase = "normal"
+        return self.sprites.centered(self.sprites.player[phase, self.player_dir], px, py)
 
-    def draw_hud(self):
+    def hud_lines(self):
         top = f"SCORE {self.score:06d}   LIVES {self.lives}   LEVEL {self.level}"
-        self.screen.blit(self.font.render(top, True, (246, 232, 182)), (24, 20))
-
         bonus = f"BONUS: {self.bonus_timer:04.1f}s" if self.bonus_mode else "BONUS: off"
-        self.screen.blit(self.small.render(bonus, True, (255, 184, 88)), (24, 54))
-
         aud = (
             f"Music: {'on' if self.audio.music_enabled else 'off'} {self.audio.music_volume:.1f}"
             f" | SFX: {'on' if self.audio.sfx_enabled else 'off'} {self.audio.sfx_volume:.1f}"
         )
-        self.screen.blit(self.small.render(aud, True, (165, 210, 255)), (410, 54))
+        return top, bonus, aud
 
+    def draw_hud(self, lines):
+        top, bonus, aud = lines
+        self.screen.blit(self.text.render(self.font, top, (246, 232, 182)), (24, 20))
+        self.screen.blit(self.text.render(self.small, bonus, (255, 184, 88)), (24, 54))
+        self.screen.blit(self.text.render(self.small, aud, (165, 210, 255)), (410, 54))
+
+    def draw_controls(self):
         controls = "Arrows bewegen | SPACE/CTRL schießen | ESC Pause | M/N Toggle | ,/. K/L Volume"
-        self.screen.blit(self.small.render(controls, True, (155, 155, 165)), (24, SCREEN_HEIGHT - 24))
+        self.screen.blit(self.text.static(self.small, controls, (155, 155, 165)), (24, SCREEN_HEIGHT - 24))
 
     def draw_overlay(self):
         if self.state == "MENU":
-            t = self.font.render("RETRO DIGGER TRIBUTE", True, (255, 220, 130))
-            s = self.small.render("ENTER: Start", True, (240, 240, 240))
+            t = self.text.static(self.font, "RETRO DIGGER TRIBUTE", (255, 220, 130))
+            s = self.text.static(self.small, "ENTER: Start", (240, 240, 240))
             self.screen.blit(t, (SCREEN_WIDTH // 2 - t.get_width() // 2, 274))
             self.screen.blit(s, (SCREEN_WIDTH // 2 - s.get_width() // 2, 310))
 
         elif self.state == "PAUSED":
-            sh = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-            sh.fill((0, 0, 0, 155))
-            self.screen.blit(sh, (0, 0))
-            title = self.font.render("PAUSED", True, (255, 255, 255))
+            self.screen.blit(self.dimmer, (0, 0))
+            title = self.text.static(self.font, "PAUSED", (255, 255, 255))
             self.screen.blit(title, (SCREEN_WIDTH // 2 - title.get_width() // 2, 240))
             opts = ["Resume", "Quit"]
             for i, txt in enumerate(opts):
                 c = (255, 220, 110) if i == self.pause_option else (190, 190, 190)
-                r = self.small.render(txt, True, c)
+                r = self.text.static(self.small, txt, c)
                 self.screen.blit(r, (SCREEN_WIDTH // 2 - r.get_width() // 2, 290 + i * 28))
 
         elif self.state == "GAME_OVER":
-            t = self.font.render("GAME OVER", True, (255, 100, 100))
-            s = self.small.render("R: Restart", True, (250, 250, 250))
+            t = self.text.static(self.font, "GAME OVER", (255, 100, 100))
+            s = self.text.static(self.small, "R: Restart", (250, 250, 250))
             self.screen.blit(t, (SCREEN_WIDTH // 2 - t.get_width() // 2, 264))
             self.screen.blit(s, (SCREEN_WIDTH // 2 - s.get_width() // 2, 300))
 
+    def draw_profiler(self):
+        x, y = SCREEN_WIDTH - 250, GRID_Y
+        lines = self.prof.overlay_lines()
+        panel = pygame.Rect(x, y, 250, len(lines) * 18)
+        self.screen.fill((10, 10, 14), panel)
+        for line in lines:
+            self.screen.blit(self.text.render(self.small, line, (150, 255, 150), (0, 0, 0)), (x, y))
+            y += 18
+        return panel
+
     def draw(self):
-        self.screen.fill((10, 10, 14))
-        self.draw_world()
-        self.draw_hud()
-        self.draw_overlay()
+        # returns None after a full repaint, otherwise the list of changed rects
+        prof = self.prof
+        self.follow_camera()
+        camera = (self.cam_x, self.cam_y)
+        items = self.sprite_list()
+        shown = set(items)
+        hud = self.hud_lines()
+        view = (self.state, self.pause_option, prof.visible)
+
+        changed = self.dirty or hud != self.drawn_hud or shown != self.drawn_sprites
+        if self.full_redraw or view != self.drawn_view or (changed and self.state != "PLAYING"):
+            self.screen.fill((10, 10, 14))
+            self.draw_world(items)
+            prof.lap("draw_world")
+            self.draw_hud(hud)
+            self.draw_controls()
+            prof.lap("draw_hud")
+            self.draw_overlay()
+            if prof.visible:
+                self.draw_profiler()
+            prof.lap("draw_overlay")
+            self.full_redraw = False
+            self.drawn_view = view
+            self.drawn_camera = camera
+            self.drawn_sprites = shown
+            self.drawn_hud = hud
+            self.dirty = []
+            return None
+
+        rects = self.dirty
+        self.dirty = []
+        if camera != self.drawn_camera:
+            # scrolled: every tile moved, repaint the whole playfield
+            rects = [self.viewport.copy()]
+            self.drawn_camera = camera
+        else:
+            rects.extend(pygame.Rect(pos, (TILE_SIZE, TILE_SIZE)) for _, pos in self.drawn_sprites ^ shown)
+        self.drawn_sprites = shown
+        if rects:
+            self.redraw_regions(rects, items)
+        prof.lap("draw_world")
+
+        if hud != self.drawn_hud:
+            band = pygame.Rect(0, 0, SCREEN_WIDTH, GRID_Y)
+            self.screen.fill((10, 10, 14), band)
+            self.draw_hud(hud)
+            self.drawn_hud = hud
+            rects.append(band)
+        prof.lap("draw_hud")
+
+        if prof.visible:
+            rects.append(self.draw_profiler())
+        prof.lap("draw_overlay")
+        return rects
+
+    def tally_events(self, events):
+        for kind, n in events.items():
+            self.event_totals[kind] = self.event_totals.get(kind, 0) + n
+
+    def report_frame_times(self):
+        times = sorted(self.frame_times)
+        if not times:
+            return
+        pct = "  ".join(f"p{q}={times[min(len(times) - 1, len(times) * q // 100)]:.2f}" for q in (50, 95, 99))
+        print(f"frames: {len(times)} active, frame time ms {pct}  max={times[-1]:.2f}")
+        if self.event_totals:
+            print("events: " + ", ".join(f"{k} {n}" for k, n in self.event_totals.items()))
+        v = self.audio.channels.usage()
+        peak = " ".join(f"{k}={n}" for k, n in v["peak"].items())
+        print(
+            f"voices: {v['played']} played, {v['stolen']} stolen, {v['dropped']} dropped, "
+            f"{v['limited']} over limit, {v['cooldown']} in cooldown; peak {peak}"
+        )
 
     def run(self):
         running = True
+        acc = 0.0
+        last_frame = None
         while running:
-            dt = self.clock.tick(FPS) / 1000.0
-            for ev in pygame.event.get():
+            view = (self.state, self.pause_option, self.prof.visible)
+            if self.state != "PLAYING" and view == self.drawn_view and not self.full_redraw:
+                # nothing moves outside PLAYING: once the screen is current, sleep until input
+                events = [pygame.event.wait()] + pygame.event.get()
+                self.clock.tick()
+                acc = 0.0
+                last_frame = None
+            else:
+                # fixed-timestep simulation fed with real time (clock.tick only
+                # paces, its whole-ms result would starve uncapped frames),
+                # capped so a stall can't spiral
+                self.clock.tick(self.fps)
+                now = time.perf_counter()
+                if last_frame is not None:
+                    acc += min(now - last_frame, 0.25)
+                    self.frame_times.append((now - last_frame) * 1000)
+                last_frame = now
+                events = pygame.event.get()
+            self.prof.begin()
+            for ev in events:
                 if ev.type == pygame.QUIT:
                     running = False
                 elif ev.type == pygame.KEYDOWN:
                     self.handle_keydown(ev.key)
+                elif ev.type == pygame.WINDOWEXPOSED:
+                    self.full_redraw = True
+
+            if self.state == "PLAYING":
+                self.poll_keyboard_direction()
+            self.prof.lap("events")
+            while acc >= self.TICK:
+                self.step()
+                acc -= self.TICK
+            self.alpha = acc / self.TICK
+            self.events.dispatch()
+            self.prof.lap("update.rest")
+            rects = self.draw()
+            if rects is None:
+                pygame.display.flip()
+            elif rects:
+                pygame.display.update(rects)
+            self.prof.lap("flip")
+            self.prof.end_frame(self)
+            if self.started is not None:
+                print(f"cold start: {(time.perf_counter() - self.started) * 1000:.0f} ms to first frame")
+                self.started = None
+
+        self.prof.dump()
+        self.report_frame_times()
+        if self.recorder is not None:
+            self.recorder.finish(self)
+            self.recorder.save(self.record_path)
+            print(f"record: {self.ticks} ticks, {self.recorder.count} inputs written to {self.record_path}")
+        if self.broadcaster is not None:
+            b = self.broadcaster
+            b.close()
+            print(f"broadcast: {b.frames} frames, {b.sent_bytes} bytes sent on {b.address}")
+        pygame.quit()
 
-            self.update(dt)
-            self.draw()
-            pygame.display.flip()
 
-        pygame.quit()
+def seed_arg(text):
+    seed = int(text)
+    if not 0 <= seed < 2**64:
+        raise argparse.ArgumentTypeError(f"seed must be between 0 and {2**64 - 1}")
+    return seed
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Retro Digger Tribute")
+    ap.add_argument("--profile", metavar="PATH", help="record per-frame timings to a .csv or .json trace")
+    ap.add_argument("--seed", type=seed_arg, help="seed for level layout and monster behaviour")
+    ap.add_argument("--record", metavar="PATH", help="record this session's inputs to a replay log")
+    ap.add_argument("--replay", metavar="PATH", help="re-simulate a replay log headless and verify it")
+    ap.add_argument("--fps", type=int, default=FPS, help="target render rate; simulation stays at a fixed 60 Hz")
+    ap.add_argument("--uncapped", action="store_true", help="render as fast as possible (benchmarking)")
+    ap.add_argument("--width", type=int, default=GRID_W, help=f"map width in tiles (up to {MAX_GRID})")
+    ap.add_argument("--height", type=int, default=GRID_H, help=f"map height in tiles (up to {MAX_GRID})")
+    ap.add_argument("--swarm", type=int, default=0, metavar="N", help="swarm level: N monsters in vectorized storage")
+    ap.add_argument("--broadcast", metavar="ADDR", help="stream the game to spectators on host:port or unix:/path")
+    args = ap.parse_args(argv)
 
+    if args.replay:
+        sys.exit(0 if replay(args.replay) else 1)
 
-def main():
+    started = time.perf_counter()
     pygame.mixer.pre_init(44100, -16, 1, 512)
     pygame.init()
     pygame.display.set_caption("Retro Digger Tribute")
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    Game(screen).run()
+    Game(
+        screen, args.seed, started=started, profile=args.profile, record=args.record,
+        fps=args.fps, uncapped=args.uncapped, width=args.width, height=args.height, swarm=args.swarm,
+        broadcast=args.broadcast,
+    ).run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+"""Spectator stream checks: a slow viewer must still end up with the host's
+exact state, and hosts must not take over or delete each other's sockets.
+
+    python -m pytest -q test_broadcast.py
+"""
+import errno
+import os
+import socket
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pytest
+
+import broadcast
+from batch import GreedyBot
+from broadcast import Broadcaster, Spectator
+from main import Simulation
+
+
+def _bag_rows(sim):
+    return {b.seq: (b.seq, b.tx, b.ty, sim.BAG_STATES.index(b.state), int(b.offset_y * 256) & 0xFF) for b in sim.bags}
+
+
+def test_slow_reader_resyncs_on_frame_boundaries(tmp_path, monkeypatch):
+    # tiny socket buffers and a tiny backlog force partial sends, dropped
+    # deltas and keyframes cut short by the next resync
+    monkeypatch.setattr(broadcast, "MAX_BACKLOG", 4096)
+    address = f"unix:{tmp_path / 'host.sock'}"
+    sim = Simulation(5, width=300, height=300)
+    sim.start()
+    host = Broadcaster(address, keyframe_ticks=40)
+    viewer = Spectator(address)
+    viewer.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    host.publish(sim)
+    for sock in host.clients:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+
+    bot = GreedyBot()
+    try:
+        for t in range(600):
+            bot.act(sim)
+            sim.step()
+            host.publish(sim)
+            if t % 25 == 0:
+                assert viewer.poll()
+
+        # stop the game and let the viewer drain whatever is still queued
+        for _ in range(2000):
+            host.publish(sim)
+            assert viewer.poll(0.01)
+            if viewer.synced and viewer.tick == sim.ticks and not any(c.out for c in host.clients.values()):
+                break
+        assert viewer.synced and viewer.tick == sim.ticks
+        assert bytes(viewer.tiles) == bytes(sim.tilemap.cells)
+        assert viewer.emeralds == sim.emeralds
+        assert viewer.bags == _bag_rows(sim)
+    finally:
+        viewer.sock.close()
+        host.close()
+
+
+def test_live_socket_is_not_taken_over(tmp_path):
+    address = f"unix:{tmp_path / 'host.sock'}"
+    first = Broadcaster(address)
+    try:
+        with pytest.raises(OSError) as err:
+            Broadcaster(address)
+        assert err.value.errno == errno.EADDRINUSE
+        Spectator(address).sock.close()  # the first host is still reachable
+    finally:
+        first.close()
+    assert not os.path.exists(tmp_path / "host.sock")
+
+
+def test_stale_socket_is_replaced_and_other_files_kept(tmp_path):
+    path = tmp_path / "host.sock"
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    dead.bind(str(path))
+    dead.close()  # leaves the file behind, nobody listening
+    host = Broadcaster(f"unix:{path}")
+    host.close()
+
+    plain = tmp_path / "notes.txt"
+    plain.write_text("keep")
+    with pytest.raises(FileExistsError):
+        Broadcaster(f"unix:{plain}")
+    assert plain.read_text() == "keep"
+
+
+def test_close_leaves_a_replaced_socket_alone(tmp_path):
+    path = tmp_path / "host.sock"
+    host = Broadcaster(f"unix:{path}")
+    os.unlink(path)
+    other = Broadcaster(f"unix:{path}")
+    try:
+        host.close()
+        assert path.exists()
+        Spectator(f"unix:{path}").sock.close()
+    finally:
+        other.close()